@@ -6,7 +6,9 @@ import traceback
 import time
 import threading
 import platform
+import importlib
 # third-party
+from sqlalchemy import text
 
 # sjva 공용
 from framework import app, db, scheduler, path_app_root, path_data
@@ -15,8 +17,10 @@ from framework.util import Util
 
 # 패키지
 from .plugin import logger, package_name
-from .model import ModelSetting
-from .logic_gsheet import LogicGSheet
+from .model import ModelSetting, WSModelItem, ListModelItem
+from .logic_gsheet import LogicGSheet, GoogleClientFactory
+from .logic_gclone import LogicGclone
+from .logic_autorclone import SAPool
 #########################################################
 
 class Logic(object):
@@ -31,9 +35,19 @@ class Logic(object):
         'gclone_fix_option' : '--log-level INFO --stats 1s',
         'gclone_user_option' : '--drive-server-side-across-configs --tpslimit 3 --transfers 3 --create-empty-src-dirs --ignore-existing --size-only --disable ListR',
         'gclone_default_folderid' : '',
+        'gclone_worker_count' : '1',
+        'gclone_use_rc' : 'False',
+        'gclone_rc_port' : '5572',
+        'gclone_emit_rate' : '2',
+        'gclone_use_sa_pool' : 'False',
+        'autorclone_sa_daily_limit' : '750',
+        'autorclone_sa_cooldown' : '60',
         # added by orial for gsheet
         'gsheet_auto_start': 'False',
         'gsheet_interval': '60',
+        'gsheet_worker_count': '2',
+        'gsheet_writeback_interval': '10',
+        'gsheet_copy_column': '',
         'use_user_setting': 'True',
         'category_rules': u'영화/국내\n드라마/국내',
         'keyword_rules': u'',
@@ -45,8 +59,24 @@ class Logic(object):
         'copy_count_limit':'1',
         'copy_mode':'0',
         'plex_condition':'0',   # 미사용
+        'gsheet_cache_ttl':'10080',
+        'gsheet_cache_negative_ttl':'360',
+        'gsheet_cache_max_entries':'100000',
     }
 
+    # (import 모듈, pip 패키지): 시작시 background로 확인/설치
+    dependencies = [
+        ('googleapiclient.discovery', 'google-api-python-client'),
+        ('oauth2client.service_account', 'oauth2client'),
+        ('gspread', 'gspread'),
+        ('google_auth_oauthlib.flow', 'google_auth_oauthlib'),
+    ]
+    warmup_thread = None
+    warmup_ready = threading.Event()
+    warmup_wait = 60
+    # status: wait, running, ready, failed
+    warmup_state = {'status':'wait', 'timings':[], 'error':None}
+
     @staticmethod
     def db_init():
         try:
@@ -55,6 +85,7 @@ class Logic(object):
                     db.session.add(ModelSetting(key, value))
             db.session.commit()
             Logic.migration()
+            LogicGclone.migrate_queue()
         except Exception as e: 
             logger.error('Exception:%s', e)
             logger.error(traceback.format_exc())
@@ -63,7 +94,10 @@ class Logic(object):
     def plugin_load():
         try:
             logger.debug('%s plugin_load', package_name)
+            timings = []
+            start = time.time()
             Logic.db_init()
+            start = Logic.add_timing(timings, 'db_init', start)
             from .plugin import plugin_info
             Util.save_from_dict_to_json(plugin_info, os.path.join(os.path.dirname(__file__), 'info.json'))
 
@@ -72,25 +106,90 @@ class Logic(object):
                 os.makedirs(tmp)
             if not os.path.exists(ModelSetting.get('path_accounts')):
                 os.makedirs(ModelSetting.get('path_accounts'))
-            try:
-                from google_auth_oauthlib.flow import InstalledAppFlow
-            except:
-                os.system("{} install google_auth_oauthlib".format(app.config['config']['pip']))
-                from google_auth_oauthlib.flow import InstalledAppFlow
 
             tmp = os.path.join(os.path.dirname(__file__), 'bin')
             if os.path.exists(tmp):
                 os.system('chmod 777 -R "%s"' % tmp)
+            start = Logic.add_timing(timings, 'files', start)
+            # 패키지 설치/구글 인증은 background에서 처리
+            Logic.start_warmup()
             if ModelSetting.query.filter_by(key='gsheet_auto_start').first().value == 'True':
                 Logic.scheduler_start()
+            start = Logic.add_timing(timings, 'scheduler', start)
+            logger.info('%s plugin_load: %s', package_name, Logic.format_timings(timings))
         except Exception as e: 
             logger.error('Exception:%s', e)
             logger.error(traceback.format_exc())
+
+    @staticmethod
+    def add_timing(timings, name, start):
+        now = time.time()
+        timings.append((name, now - start))
+        return now
+
+    @staticmethod
+    def format_timings(timings):
+        return ', '.join(['%s %.2fs' % (name, elapsed) for name, elapsed in timings])
+
+    @staticmethod
+    def start_warmup():
+        if Logic.warmup_thread is not None and Logic.warmup_thread.is_alive():
+            return
+        Logic.warmup_ready.clear()
+        Logic.warmup_thread = threading.Thread(target=Logic.warmup_function)
+        Logic.warmup_thread.setDaemon(True)
+        Logic.warmup_thread.start()
+
+    @staticmethod
+    def warmup_function():
+        timings = Logic.warmup_state['timings'] = []
+        Logic.warmup_state['status'] = 'running'
+        Logic.warmup_state['error'] = None
+        try:
+            start = time.time()
+            Logic.check_dependencies()
+            start = Logic.add_timing(timings, 'dependency', start)
+            GoogleClientFactory.get_discovery('drive', 'v3')
+            start = Logic.add_timing(timings, 'discovery', start)
+            if LogicGSheet.get_first_json() is not None:
+                LogicGSheet.google_api_auth()
+                LogicGSheet.get_service()
+                start = Logic.add_timing(timings, 'auth', start)
+            else:
+                logger.warning('warm-up: no json file in (%s)', ModelSetting.get('path_accounts'))
+            Logic.warmup_state['status'] = 'ready'
+        except Exception as e: 
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+            Logic.warmup_state['status'] = 'failed'
+            Logic.warmup_state['error'] = str(e)
+        finally:
+            Logic.warmup_ready.set()
+            logger.info('%s warm-up %s: %s', package_name, Logic.warmup_state['status'], Logic.format_timings(timings))
+
+    @staticmethod
+    def check_dependencies():
+        for module, package in Logic.dependencies:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                logger.info('warm-up: install %s', package)
+                os.system("{} install {}".format(app.config['config']['pip'], package))
+                importlib.import_module(module)
+
+    @staticmethod
+    def get_warmup_text():
+        state = Logic.warmup_state
+        ret = '%s (%s)' % (state['status'], Logic.format_timings(state['timings']))
+        if state['error'] is not None:
+            ret += ' ' + state['error']
+        return ret
     
     @staticmethod
     def plugin_unload():
         try:
             logger.debug('%s plugin_unload', package_name)
+            SAPool.save_ledger(force=True)
         except Exception as e: 
             logger.error('Exception:%s', e)
             logger.error(traceback.format_exc())
@@ -116,6 +215,10 @@ class Logic(object):
     @staticmethod
     def scheduler_function():
         try:
+            # 시작 직후에는 warm-up(패키지 설치/인증)이 끝날 때까지 대기
+            if not Logic.warmup_ready.wait(Logic.warmup_wait):
+                logger.info('SKIP: warm-up is not finished')
+                return
             if app.config['config']['use_celery']:
                 result = LogicGSheet.scheduler_function.apply_async()
                 result.get()
@@ -128,59 +231,123 @@ class Logic(object):
     @staticmethod
     def migration():
         LogicGSheet.ws_ir_init()
-        LogicGSheet.google_api_auth()
-        # TEMP CODE
+        # db_version 이후의 단계만 순서대로 적용
+        # 각 단계는 이미 반영된 DB(신규설치)에 다시 실행해도 안전해야 함
         try:
-            # for temporary: ListModelItem Table alter
-            import sqlite3
-            db_path = os.path.join(path_data, 'db', '%s.db' % package_name)
-            table_name = '%s_listitem' % package_name
-
-            if platform.system() is 'Linux':
-                # connect to read only for Linux
-                fd = os.open(db_path, os.O_RDWR)
-                conn = sqlite3.connect('/dev/fd/%d' % fd)
-                os.close(fd)
-            else:
-                conn = sqlite3.connect(db_path)
-            cur = conn.cursor()
-            q = 'PRAGMA table_info("{table_name}")'.format(table_name=table_name)
-            alter_byte_size = True
-            alter_updated_time = True
-            alter_excluded = True
-            alter_mimetype = True
-            for row in cur.execute(q).fetchall():
-                if row[1] == 'byte_size': alter_byte_size = False
-                if row[1] == 'updated_time': alter_updated_time = False
-                if row[1] == 'excluded': alter_excluded = False
-                if row[1] == 'mimetype': alter_mimetype = False
-
-            if alter_byte_size is False and alter_updated_time is False and alter_excluded is False and alter_mimetype is False:
-                conn.close()
-                return
-
-            if alter_byte_size:
-                query = 'ALTER TABLE {table_name} ADD COLUMN byte_size INTEGER default 0'.format(table_name=table_name)
-                cur.execute(query)
-                logger.info('LiteModelItem Alterred(column: byte_size)')
-            if alter_updated_time:
-                query = 'ALTER TABLE {table_name} ADD COLUMN updated_time DATETIME default NULL'.format(table_name=table_name)
-                cur.execute(query)
-                logger.info('LiteModelItem Alterred(column: updated_time)')
-            if alter_excluded:
-                query = 'ALTER TABLE {table_name} ADD COLUMN excluded INTEGER default 0'.format(table_name=table_name)
-                cur.execute(query)
-                logger.info('LiteModelItem Alterred(column: excluded)')
-            if alter_mimetype:
-                query = 'ALTER TABLE {table_name} ADD COLUMN mimetype INTEGER default 0'.format(table_name=table_name)
-                cur.execute(query)
-                logger.info('LiteModelItem Alterred(column: mimetype)')
-            conn.commit()
-            conn.close()
+            db_version = ModelSetting.get_int('db_version') or 1
+            engine = db.get_engine(app, bind=package_name)
+            for version, func in Logic.get_migrations():
+                if version <= db_version:
+                    continue
+                with engine.begin() as conn:
+                    applied = func(conn)
+                # False: 이번에는 적용할 수 없는 단계, 버전을 올리지 않고 다음 시작시 다시 시도
+                if applied is False:
+                    logger.warning('DB migration stopped: version(%d) not applied', version)
+                    break
+                ModelSetting.set('db_version', str(version))
+                logger.info('DB migrated: version(%d)', version)
         except Exception as e: 
             logger.error('Exception:%s', e)
             logger.error(traceback.format_exc())
 
+    @staticmethod
+    def get_migrations():
+        return [(2, Logic.migration_v2),
+                (3, Logic.migration_v3),
+                (4, Logic.migration_v4),
+                (5, Logic.migration_v5)]
+
+    @staticmethod
+    def get_columns(conn, table_name):
+        # 컬럼명 -> 타입
+        return {row[1]:row[2] for row in conn.execute(text('PRAGMA table_info("{table_name}")'.format(table_name=table_name)))}
+
+    @staticmethod
+    def add_column(conn, table_name, column, column_type):
+        if column in Logic.get_columns(conn, table_name):
+            return
+        conn.execute(text('ALTER TABLE {table_name} ADD COLUMN {column} {column_type}'.format(table_name=table_name, column=column, column_type=column_type)))
+        logger.info('%s Alterred(column: %s)', table_name, column)
+
+    @staticmethod
+    def create_indexes(conn, table):
+        # 모델에 선언된 index 생성
+        for index in table.indexes:
+            conn.execute(text('CREATE INDEX IF NOT EXISTS {name} ON {table_name} ({columns})'.format(
+                name=index.name, table_name=table.name, columns=', '.join([c.name for c in index.columns]))))
+
+    @staticmethod
+    def migration_v2(conn):
+        # 이전 버전에서 추가된 컬럼
+        table_name = ListModelItem.__tablename__
+        Logic.add_column(conn, table_name, 'byte_size', 'INTEGER default 0')
+        Logic.add_column(conn, table_name, 'updated_time', 'DATETIME default NULL')
+        Logic.add_column(conn, table_name, 'excluded', 'INTEGER default 0')
+        Logic.add_column(conn, table_name, 'mimetype', 'INTEGER default 0')
+        Logic.add_column(conn, table_name, 'fingerprint', 'VARCHAR default NULL')
+        table_name = WSModelItem.__tablename__
+        Logic.add_column(conn, table_name, 'doc_version', 'VARCHAR default NULL')
+        Logic.add_column(conn, table_name, 'content_hash', 'VARCHAR default NULL')
+        Logic.add_column(conn, table_name, 'lease_time', 'DATETIME default NULL')
+
+    @staticmethod
+    def migration_v3(conn):
+        # 조회 조건 컬럼 index
+        Logic.create_indexes(conn, ListModelItem.__table__)
+        Logic.create_indexes(conn, WSModelItem.__table__)
+
+    @staticmethod
+    def migration_v4(conn):
+        # ListModelItem.sheet_id: VARCHAR -> INTEGER, sqlite는 컬럼 타입 변경이 안되므로 테이블 재생성
+        table_name = ListModelItem.__tablename__
+        columns = Logic.get_columns(conn, table_name)
+        if columns.get('sheet_id', '').upper() == 'INTEGER':
+            return
+        old_table_name = '%s_old' % table_name
+        conn.execute(text('ALTER TABLE {table_name} RENAME TO {old_table_name}'.format(table_name=table_name, old_table_name=old_table_name)))
+        # index는 이름이 같으므로 이전 테이블에서 삭제
+        for row in conn.execute(text('PRAGMA index_list("{table_name}")'.format(table_name=old_table_name))).fetchall():
+            if not row[1].startswith('sqlite_autoindex'):
+                conn.execute(text('DROP INDEX IF EXISTS {name}'.format(name=row[1])))
+        ListModelItem.__table__.create(bind=conn)
+        names = [c.name for c in ListModelItem.__table__.columns if c.name in columns]
+        values = ['CAST(sheet_id AS INTEGER)' if x == 'sheet_id' else x for x in names]
+        conn.execute(text('INSERT INTO {table_name} ({names}) SELECT {values} FROM {old_table_name}'.format(
+            table_name=table_name, names=', '.join(names), values=', '.join(values), old_table_name=old_table_name)))
+        conn.execute(text('DROP TABLE {old_table_name}'.format(old_table_name=old_table_name)))
+        logger.info('%s rebuilt(column: sheet_id INTEGER)', table_name)
+
+    @staticmethod
+    def migration_v5(conn):
+        # 아이템 검색용 FTS5 trigram index, 트리거로 동기화
+        # sqlite 3.34 미만 등 생성할 수 없는 경우 LIKE 검색 사용
+        table_name = ListModelItem.__tablename__
+        fts_table_name = ListModelItem.fts_table_name
+        columns = 'title, title2, category, folder_id'
+        new_values = 'new.title, new.title2, new.category, new.folder_id'
+        old_values = 'old.title, old.title2, old.category, old.folder_id'
+        try:
+            conn.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns}, content='{table_name}', content_rowid='id', tokenize='trigram')".format(
+                fts=fts_table_name, columns=columns, table_name=table_name)))
+        except Exception as e:
+            logger.error('Exception:%s', e)
+            logger.warning('FTS5 trigram is not supported, item search uses LIKE')
+            return False
+        conn.execute(text('CREATE TRIGGER IF NOT EXISTS {table_name}_fts_ai AFTER INSERT ON {table_name} BEGIN '
+            'INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END'.format(
+            table_name=table_name, fts=fts_table_name, columns=columns, new_values=new_values)))
+        conn.execute(text('CREATE TRIGGER IF NOT EXISTS {table_name}_fts_ad AFTER DELETE ON {table_name} BEGIN '
+            "INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END".format(
+            table_name=table_name, fts=fts_table_name, columns=columns, old_values=old_values)))
+        conn.execute(text('CREATE TRIGGER IF NOT EXISTS {table_name}_fts_au AFTER UPDATE OF {columns} ON {table_name} BEGIN '
+            "INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+            'INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END'.format(
+            table_name=table_name, fts=fts_table_name, columns=columns, old_values=old_values, new_values=new_values)))
+        conn.execute(text("INSERT INTO {fts}({fts}) VALUES ('rebuild')".format(fts=fts_table_name)))
+        ListModelItem.fts_enabled = None
+        logger.info('%s created', fts_table_name)
+
     ##################################################################################
 
     
@@ -79,4 +79,244 @@ class LogicAutoRclone(object):
                 return jsonify(email_list)
         except Exception as e: 
             logger.error('Exception:%s', e)
-            logger.error(traceback.format_exc())
\ No newline at end of file
+            logger.error(traceback.format_exc())
+
+
+class SAPool(object):
+    # 서비스 계정 목록은 메모리에 보관하고 폴더 mtime이 바뀐 경우에만 다시 읽음
+    # 계정별 복사량/403,429 오류를 시간 단위로 기록하고 최근 24시간 합계로 사용량 판단
+    lock = threading.RLock()
+    accounts = []
+    accounts_dir = None
+    dirs = []
+    signature = None
+    checked_time = 0
+    check_interval = 30
+    ledger = None
+    ledger_dirty = False
+    saved_time = 0
+    save_interval = 60
+    window = 24 * 3600
+    bucket_seconds = 3600
+    error_regex = re.compile(r'Error (?P<code>403|429)\b')
+    quota_regex = re.compile(r'(rateLimitExceeded|userRateLimitExceeded|dailyLimitExceeded|quotaExceeded|[Rr]ate [Ll]imit)')
+    size_regex = re.compile(r'(?P<num>[\d\.]+)\s*(?P<unit>[kKMGTP]?)')
+    size_units = {'':1, 'K':1024, 'M':1024**2, 'G':1024**3, 'T':1024**4, 'P':1024**5}
+
+    @staticmethod
+    def get_ledger_path():
+        return os.path.join(path_data, package_name, 'sa_ledger.json')
+
+    @staticmethod
+    def get_signature(dirs):
+        ret = []
+        for d in dirs:
+            try:
+                ret.append(os.stat(d).st_mtime)
+            except OSError:
+                ret.append(None)
+        return tuple(ret)
+
+    @staticmethod
+    def refresh(force=False):
+        # 하위 폴더(프로젝트별 분리) 포함, 파일 추가/삭제시 해당 폴더 mtime이 바뀜
+        with SAPool.lock:
+            now = time.time()
+            accounts_dir = ModelSetting.get('path_accounts')
+            if not force and accounts_dir == SAPool.accounts_dir:
+                if now - SAPool.checked_time < SAPool.check_interval:
+                    return
+                SAPool.checked_time = now
+                if SAPool.get_signature(SAPool.dirs) == SAPool.signature:
+                    return
+            accounts = []
+            dirs = []
+            for (path, dir, files) in os.walk(accounts_dir):
+                dirs.append(path)
+                for fname in files:
+                    if os.path.splitext(fname)[-1] == '.json':
+                        accounts.append(os.path.join(path, fname))
+            accounts.sort()
+            SAPool.accounts = accounts
+            SAPool.accounts_dir = accounts_dir
+            SAPool.dirs = dirs
+            SAPool.signature = SAPool.get_signature(dirs)
+            SAPool.checked_time = now
+            logger.debug('SAPool loaded: %d accounts', len(accounts))
+
+    @staticmethod
+    def load_ledger():
+        if SAPool.ledger is not None:
+            return
+        SAPool.ledger = {}
+        try:
+            path = SAPool.get_ledger_path()
+            if os.path.exists(path):
+                with open(path, 'r') as f:
+                    SAPool.ledger = json.loads(f.read())
+        except Exception as e:
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+
+    @staticmethod
+    def save_ledger(force=False):
+        with SAPool.lock:
+            if SAPool.ledger is None or not SAPool.ledger_dirty:
+                return
+            now = time.time()
+            if not force and now - SAPool.saved_time < SAPool.save_interval:
+                return
+            try:
+                SAPool.prune(now)
+                path = SAPool.get_ledger_path()
+                tmp_path = path + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    f.write(json.dumps(SAPool.ledger))
+                if os.path.exists(path):
+                    os.remove(path)
+                os.rename(tmp_path, path)
+                SAPool.ledger_dirty = False
+                SAPool.saved_time = now
+            except Exception as e:
+                logger.error('Exception:%s', e)
+                logger.error(traceback.format_exc())
+
+    @staticmethod
+    def prune(now):
+        # 24시간이 지난 기록은 삭제
+        start = int((now - SAPool.window) // SAPool.bucket_seconds)
+        for name, entry in SAPool.ledger.items():
+            buckets = entry.get('buckets', {})
+            for key in [x for x in buckets.keys() if int(x) <= start]:
+                del buckets[key]
+
+    @staticmethod
+    def get_entry(name):
+        if name not in SAPool.ledger:
+            SAPool.ledger[name] = {'buckets':{}, 'last_error':0, 'last_used':0}
+        return SAPool.ledger[name]
+
+    @staticmethod
+    def get_usage(name, now):
+        start = int((now - SAPool.window) // SAPool.bucket_seconds)
+        size = errors = 0
+        entry = SAPool.ledger.get(name)
+        if entry is not None:
+            for key, value in entry.get('buckets', {}).items():
+                if int(key) > start:
+                    size += value[0]
+                    errors += value[1]
+        return size, errors
+
+    @staticmethod
+    def is_healthy(name, now):
+        size, errors = SAPool.get_usage(name, now)
+        if size >= (ModelSetting.get_int('autorclone_sa_daily_limit') or 750) * 1024**3:
+            return False
+        entry = SAPool.ledger.get(name)
+        if entry is not None and now - entry.get('last_error', 0) < (ModelSetting.get_int('autorclone_sa_cooldown') or 0) * 60:
+            return False
+        return True
+
+    @staticmethod
+    def get_account():
+        # 사용 가능한 계정 중 최근 24시간 복사량이 가장 적은 계정, 같으면 오래전에 사용한 계정
+        try:
+            with SAPool.lock:
+                SAPool.refresh()
+                SAPool.load_ledger()
+                if not SAPool.accounts:
+                    return None
+                now = time.time()
+                candidates = [x for x in SAPool.accounts if SAPool.is_healthy(os.path.basename(x), now)]
+                if not candidates:
+                    logger.warning('SAPool: no healthy account, use least used account')
+                    candidates = SAPool.accounts
+                def sort_key(path):
+                    name = os.path.basename(path)
+                    return (SAPool.get_usage(name, now)[0], SAPool.ledger.get(name, {}).get('last_used', 0))
+                ret = min(candidates, key=sort_key)
+                SAPool.get_entry(os.path.basename(ret))['last_used'] = now
+                SAPool.ledger_dirty = True
+                return ret
+        except Exception as e:
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+            return None
+
+    @staticmethod
+    def get_first():
+        with SAPool.lock:
+            SAPool.refresh()
+            return SAPool.accounts[0] if SAPool.accounts else None
+
+    @staticmethod
+    def record(path, size=0, error=False):
+        if path is None:
+            return
+        with SAPool.lock:
+            SAPool.load_ledger()
+            now = time.time()
+            entry = SAPool.get_entry(os.path.basename(path))
+            key = str(int(now // SAPool.bucket_seconds))
+            bucket = entry['buckets'].setdefault(key, [0, 0])
+            bucket[0] += int(size or 0)
+            if error:
+                bucket[1] += 1
+                entry['last_error'] = now
+            SAPool.ledger_dirty = True
+        SAPool.save_ledger()
+
+    @staticmethod
+    def add_bytes(path, size):
+        if size:
+            SAPool.record(path, size=size)
+
+    @staticmethod
+    def check_error(path, text, code=None):
+        # 429 또는 할당량 관련 403만 오류로 기록, 기록한 경우 코드 반환
+        if code is None:
+            match = SAPool.error_regex.search(text)
+            if match is None:
+                return None
+            code = int(match.group('code'))
+        if code == 429 or (code == 403 and SAPool.quota_regex.search(text)):
+            logger.warning('SAPool: quota error(%d) %s', code, os.path.basename(path) if path else '')
+            SAPool.record(path, error=True)
+            return code
+        return None
+
+    @staticmethod
+    def parse_size(text):
+        # '1.234 GBytes', '12.5 GiB' 형식
+        if not text:
+            return 0
+        match = SAPool.size_regex.search(text)
+        if match is None:
+            return 0
+        return int(float(match.group('num')) * SAPool.size_units[match.group('unit').upper()])
+
+    @staticmethod
+    def get_stats():
+        ret = []
+        try:
+            with SAPool.lock:
+                SAPool.refresh()
+                SAPool.load_ledger()
+                now = time.time()
+                for path in SAPool.accounts:
+                    name = os.path.basename(path)
+                    size, errors = SAPool.get_usage(name, now)
+                    entry = SAPool.ledger.get(name, {})
+                    last_used = entry.get('last_used', 0)
+                    ret.append({
+                        'name' : os.path.relpath(path, SAPool.accounts_dir),
+                        'size' : '%.2f GB' % (size / 1024.0**3),
+                        'errors' : errors,
+                        'last_used' : datetime.fromtimestamp(last_used).strftime('%m-%d %H:%M:%S') if last_used else '-',
+                        'healthy' : SAPool.is_healthy(name, now),
+                    })
+        except Exception as e:
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+        return ret
@@ -12,8 +12,12 @@ import threading
 import json
 import platform
 import shutil
+import collections
+import gzip
+import io
 
 # third-party
+import requests
 from flask import Blueprint, request, Response, send_file, render_template, redirect, jsonify
 
 # sjva 공용
@@ -28,7 +32,8 @@ from rclone_expand.model import ModelSetting
 
 # 패키지
 from .plugin import logger, package_name
-from .model import ModelSetting
+from .model import ModelSetting, ModelGcloneJob
+from .logic_autorclone import SAPool
 
 #########################################################
 
@@ -45,18 +50,16 @@ class LogicGclone(object):
                 LogicGclone.current_data['user_stop'] = True
                 ret = LogicGclone.kill()
                 return jsonify(ret)
+            elif sub == 'stop_worker':
+                idx = int(req.form['idx'])
+                if idx < 0 or idx >= len(LogicGclone.workers):
+                    return jsonify('not_running')
+                ret = LogicGclone.kill(LogicGclone.workers[idx])
+                return jsonify(ret)
             elif sub == 'version':
-                command = [ModelSetting.get('gclone_path'), 'version']
-                if app.config['config']['is_py2']:
-                    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, bufsize=1)
-                else:
-                    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
-                iter_arg =  b'' if app.config['config']['is_py2'] else ''
-                ret = []
-                with process.stdout:
-                    for line in iter(process.stdout.readline, iter_arg):
-                        ret.append(line)
-                    process.wait() # wait for the subprocess to exit
+                caps = GcloneCapability.get()
+                ret = list(caps['lines'])
+                ret.append(u'fork: %s, version: %s, flags: %s' % (caps['fork'], caps['version'], ', '.join(['%s(%s)' % (k, 'O' if v else 'X') for k, v in sorted(caps['flags'].items())])))
                 return jsonify(ret)
             elif sub == 'view_config':
                 from framework.common.util import read_file
@@ -84,9 +87,23 @@ service_account_file_path = {accounts_dir}/
                     write_file(default, config_path)
                     ret = {'ret':True, 'data':read_file(config_path)}
                 return jsonify(ret)
+            elif sub == 'queue_save':
+                added, deleted = ModelGcloneJob.sync_from_text(req.form['gclone_queue_list'])
+                socketio_callback('refresh_queue', ModelGcloneJob.get_queue_text())
+                return jsonify({'ret':True, 'data':u'추가: %d, 삭제: %d' % (added, deleted)})
             elif sub == 'log_reset':
-                LogicGclone.current_data['log'] = []
+                for worker in LogicGclone.workers:
+                    worker.job_log.reset_view()
                 return jsonify('')
+            elif sub == 'log_page':
+                idx = int(req.form['idx'])
+                if idx < 0 or idx >= len(LogicGclone.workers):
+                    return jsonify({'ret':False, 'data':u'작업 정보가 없습니다.'})
+                offset = int(req.form['offset']) if 'offset' in req.form else 0
+                limit = int(req.form['limit']) if 'limit' in req.form else 200
+                ret = LogicGclone.workers[idx].job_log.page(offset, limit)
+                ret['ret'] = True
+                return jsonify(ret)
         except Exception as e: 
             logger.error('Exception:%s', e)
             logger.error(traceback.format_exc())
@@ -97,8 +114,7 @@ service_account_file_path = {accounts_dir}/
             if sub == 'append':
                 ret = {}
                 cmd = req.form['cmd']
-                tmp = ModelSetting.get('gclone_queue_list')
-                if tmp.find(cmd) != -1:
+                if LogicGclone.queue_exist(cmd):
                     ret['status'] = 'already_exist'
                 else:
                     ret['status'] = LogicGclone.current_data['status']
@@ -111,98 +127,103 @@ service_account_file_path = {accounts_dir}/
             logger.error(traceback.format_exc())
  
     ###################
-    current_process = None
-    current_data = {'user_stop':False, 'status':'ready', 'command':''}
-
-    trans_regexes = [
-        r'Transferred\:\s*(?P<trans_data_current>(\d.*?|off))\s\/\s(?P<trans_total_size>\d.*?)\,\s*((?P<trans_percent>\d+)\%)?\-?\,\s*(?P<trans_speed>\d.*?)\,\sETA\s(((?P<rt_hour>\d+)h)*((?P<rt_min>\d+)m)*((?P<rt_sec>.*?)s)*)?\-?',
-        r'Errors\:\s*(?P<error>\d+)',
-        r'Checks\:\s*(?P<check_1>\d+)\s\/\s(?P<check_2>\d+)\,\s*(?P<check_percent>\d+)?\-?',
-        r'Transferred\:\s*(?P<file_1>\d+)\s\/\s(?P<file_2>\d+)\,\s*((?P<file_percent>\d+)\%)?\-?',
-        r'Elapsed\stime\:\s*((?P<r_hour>\d+)h)*((?P<r_min>\d+)m)*((?P<r_sec>.*?)s)*',
-        r'\s*\*\s((?P<folder>.*)\/)?(?P<name>.*?)\:\s*(?P<percent>\d+)\%\s*\/(?P<size>\d.*?)\,\s*(?P<speed>\d.*?)\,\s*((?P<rt_hour>\d+)h)*((?P<rt_min>\d+)m)*((?P<rt_sec>.*?)s)*', 
-        r'INFO\s*\:\s*((?P<folder>.*)\/)?(?P<name>.*?)\:\s*(?P<status>.*)'
-    ]
-
-    fclone_trans_regexes = [
-        r'Transferred:\s*(?P<current>(\d.*?))\s*\/\s*(?P<total>\d.*?),\s*(?P<trans_percent>\-|\d.*?)(%)?,\s*(?P<bps>\d.*?Bytes/s)?,\s*ETA\s*((?P<eta1>\-)?|((?P<rt_hour>\d+)h)?((?P<rt_min>\d+)m)?((?P<rt_sec>.*?)s)?)$',
-        r'Transferred:\s*(?P<file_1>(\d.*?))\s*\/\s*(?P<file_2>\d.*?),\s*(?P<file_percent>\-|\d.*?)(%)?,\s*(?P<fps>\d.*?Files/s)?,\s*ETA\s*((?P<eta1>\-)?|((?P<rt_hour>\d+)h)?((?P<rt_min>\d+)m)?((?P<rt_sec>.*?)s)?)$',
-        r'Errors\:\s*(?P<error>\d+)',
-        r'Checks\:\s*(?P<check_1>\d+)\s\/\s(?P<check_2>\d+)\,\s*(?P<check_percent>\d+)?\-?',
-        r'Elapsed\stime\:\s*((?P<r_hour>\d+)h)*((?P<r_min>\d+)m)*((?P<r_sec>.*?)s)*',
-        r'\s*\*\s((?P<folder>.*)\/)?(?P<name>.*?)\:\s*(?P<percent>\d+)\%\s*\/(?P<size>\d.*?)\,\s*(?P<speed>\d.*?)\,\s*((?P<rt_hour>\d+)h)*((?P<rt_min>\d+)m)*((?P<rt_sec>.*?)s)*', 
-        r'INFO\s*\:\s*((?P<folder>.*)\/)?(?P<name>.*?)\:\s*(?P<status>.*)'
-    ]
+    current_data = {'user_stop':False, 'status':'ready'}
+    workers = []
+    # 작업을 나눠갖기 위한 lock, 이번 실행에서 제외할 작업 ID
+    queue_lock = threading.Lock()
+    tried_jobs = set()
+    emitter = None
+    # 연속 오류시 worker 중지
+    max_fail_count = 5
+
 
+    @staticmethod
+    def normalize_job(q):
+        src, tar = q.split('|')
+        tmps = tar.split('/')
+        if len(tmps) > 1:
+            for i in range(1, len(tmps)):
+                tmps[i] = Util.change_text_for_use_filename(tmps[i]).replace('   ', '  ').replace('  ', ' ').rstrip('.').strip()
+            return '%s|%s/%s' % (src, tmps[0], '/'.join(tmps[1:]))
+        return q
+
+    @staticmethod
+    def queue_exist(q):
+        tmp = ModelGcloneJob.parse_line(LogicGclone.normalize_job(q))
+        if tmp is None:
+            return False
+        return ModelGcloneJob.is_pending(tmp[0], tmp[1])
 
     @staticmethod
     def queue_append(queue_list):
         try:
             logger.debug(queue_list)
-            new_queue_list = []
             for q in queue_list:
-                src, tar = q.split('|')
-                tmps = tar.split('/')
-                if len(tmps) > 1:
-                    for i in range(1, len(tmps)):
-                        tmps[i] = Util.change_text_for_use_filename(tmps[i]).replace('   ', '  ').replace('  ', ' ').rstrip('.').strip()
-                    new_queue_list.append('%s|%s/%s' % (src, tmps[0], '/'.join(tmps[1:])))
-                else:
-                    new_queue_list.append(q)
+                tmp = ModelGcloneJob.parse_line(LogicGclone.normalize_job(q))
+                if tmp is None:
+                    continue
+                entity = ModelGcloneJob.enqueue(tmp[0], tmp[1], comment=tmp[2])
+                if entity is not None:
+                    socketio_callback('queue_add', entity.to_line())
+            return LogicGclone.start()
+        except Exception as e: 
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+
+    @staticmethod
+    def get_queue_text():
+        return ModelGcloneJob.get_queue_text()
 
-            logger.debug(new_queue_list)
+    @staticmethod
+    def migrate_queue():
+        # 설정값(gclone_queue_list)에 있던 큐를 작업 테이블로 이전
+        try:
             tmp = ModelSetting.get('gclone_queue_list')
-            tmp += '\n' + '\n'.join(new_queue_list)
-            ModelSetting.set('gclone_queue_list', tmp)
-            socketio_callback('refresh_queue', ModelSetting.get('gclone_queue_list'))
-            return LogicGclone.start()
+            if tmp is None or tmp == '':
+                return
+            added = 0
+            for line in tmp.split('\n'):
+                job = ModelGcloneJob.parse_line(line)
+                if job is not None and ModelGcloneJob.enqueue(job[0], job[1], comment=job[2]) is not None:
+                    added += 1
+            ModelSetting.set('gclone_queue_list', '')
+            logger.info('gclone queue migrated: %d', added)
         except Exception as e: 
             logger.error('Exception:%s', e)
             logger.error(traceback.format_exc())
 
+    @staticmethod
+    def get_data():
+        return {'status':LogicGclone.current_data['status'], 'workers':[w.as_dict() for w in LogicGclone.workers]}
+
     @staticmethod 
     def start():
         try:
             if LogicGclone.current_data['status'] == 'is_running':
                 return 'already_running'
             elif LogicGclone.current_data['status'] == 'ready':
-                
+                worker_count = ModelSetting.get_int('gclone_worker_count')
+                if worker_count is None or worker_count < 1:
+                    worker_count = 1
+                LogicGclone.workers = [GcloneWorker(i) for i in range(worker_count)]
+                GcloneJobLog.cleanup()
+                LogicGclone.tried_jobs = set()
+                ModelGcloneJob.reset_state()
+                LogicGclone.current_data['status'] = 'is_running'
+                socketio_callback('workers', LogicGclone.get_data())
+
                 def func():
-                    LogicGclone.current_data['status'] = 'is_running'
-                    while True:
-                        count = 0
-                        job_list = ModelSetting.get_list('gclone_queue_list', '\n')
-                        for job in job_list:
-                            try:
-                                if LogicGclone.current_data['user_stop']:
-                                    break
-                                tmp = job.split('#')[0].split('|')
-                                if len(tmp) == 2:
-                                    target = tmp[1].strip()
-                                    target = target.replace('{}', '{%s}' % ModelSetting.get('gclone_default_folderid'))
-                                    if target.find('{}') != -1:
-                                        continue
-                                    if target.find(':') == -1:
-                                        continue
-                                    return_code = LogicGclone.gclone_execute(tmp[0].strip(), target)
-                                    # 0 정상
-                                    logger.debug('return_code:%s', return_code)
-                                    if return_code == 0:
-                                        tmp2 = ModelSetting.get('gclone_queue_list')
-                                        for t in tmp2.split('\n'):
-                                            if t.strip().startswith('%s|%s' % (tmp[0], tmp[1])):
-                                                ModelSetting.set('gclone_queue_list', tmp2.replace(t, ''))
-                                                socketio_callback('refresh_queue', ModelSetting.get('gclone_queue_list'))
-                                        count += 1
-                            except Exception as e: 
-                                logger.error('Exception:%s', e)
-                                logger.error(traceback.format_exc())
-                        if LogicGclone.current_data['user_stop']:
-                            break
-                        if count == 0:
-                            break
+                    threads = []
+                    for worker in LogicGclone.workers:
+                        thread = threading.Thread(target=LogicGclone.worker_function, args=(worker,))
+                        thread.setDaemon(True)
+                        thread.start()
+                        threads.append(thread)
+                    for thread in threads:
+                        thread.join()
                     LogicGclone.current_data['status'] = 'ready'
                     LogicGclone.current_data['user_stop'] = False
+                    socketio_callback('workers', LogicGclone.get_data())
                     data = {'type':'success', 'msg' : u'gclone 작업을 완료하였습니다.'}
                     socketio.emit("notify", data, namespace='/framework', broadcast=True)
                 thread = threading.Thread(target=func, args=())
@@ -215,7 +236,58 @@ service_account_file_path = {accounts_dir}/
             logger.error(traceback.format_exc())
 
     @staticmethod
-    def gclone_execute(source, target):
+    def worker_function(worker):
+        fail_count = 0
+        while True:
+            job_id = None
+            try:
+                if LogicGclone.current_data['user_stop']:
+                    break
+                job = LogicGclone.get_next_job()
+                if job is None:
+                    break
+                job_id, source, target, line = job
+                return_code = LogicGclone.gclone_execute(source, target, worker, job_id=job_id)
+                # 0 정상
+                logger.debug('worker(%d) return_code:%s', worker.idx, return_code)
+                if return_code == 0:
+                    ModelGcloneJob.set_state(job_id, 'completed')
+                    socketio_callback('queue_remove', line)
+                else:
+                    ModelGcloneJob.set_state(job_id, 'failed')
+                fail_count = 0
+            except Exception as e: 
+                logger.error('Exception:%s', e)
+                logger.error(traceback.format_exc())
+                if job_id is not None:
+                    ModelGcloneJob.set_state(job_id, 'failed')
+                # 계속 실패하면(DB 잠김 등) 대기 시간을 늘리다가 중지
+                fail_count += 1
+                if fail_count >= LogicGclone.max_fail_count:
+                    logger.error('worker(%d) stopped: too many errors', worker.idx)
+                    break
+                time.sleep(min(2 ** fail_count, 60))
+        worker.current_data['status'] = 'ready'
+        LogicGclone.trans_callback(worker, 'start')
+
+    @staticmethod
+    def get_next_job():
+        # 대기중인 작업을 하나 가져간다. 실패한 작업은 다음 시작시 재시도
+        with LogicGclone.queue_lock:
+            while True:
+                entity = ModelGcloneJob.claim_next(LogicGclone.tried_jobs)
+                if entity is None:
+                    return None
+                target = entity.target.replace('{}', '{%s}' % ModelSetting.get('gclone_default_folderid'))
+                if target.find('{}') != -1 or target.find(':') == -1:
+                    # 실행할 수 없는 작업은 대기상태로 남겨둠
+                    LogicGclone.tried_jobs.add(entity.id)
+                    ModelGcloneJob.set_state(entity.id, 'wait')
+                    continue
+                return (entity.id, entity.source, target, entity.to_line())
+
+    @staticmethod
+    def gclone_execute(source, target, worker, job_id=None):
         
             #./gclone --config ./gclone.conf copy gc:{1Qs6xsVJF7TkMk00s6W28HjdZ8onx2C4O} gc:{1BhTY6WLPRUkqKukNtQTIDMyjLO_UKMzP} --drive-server-side-across-configs -vvv --progress --tpslimit 3 --transfers 3 --stats 1s
         try:
@@ -228,33 +300,68 @@ service_account_file_path = {accounts_dir}/
                 '--config', ModelSetting.get('gclone_config_path'),
                 'copy', source, target
             ]
-            is_fclone = LogicGclone.is_fclone()
+            caps = GcloneCapability.get()
+            is_fclone = caps['fork'] == 'fclone'
+            # rc 사용시 진행상황은 rc api로 받고 텍스트 stats는 fallback 용도로만 느리게 출력
+            use_rc = ModelSetting.get_bool('gclone_use_rc')
+            if use_rc and not caps['flags']['--rc']:
+                logger.warning('--rc is not supported: %s', caps['version'])
+                use_rc = False
+            stats_interval = GcloneRcClient.fallback_stats_interval if use_rc else '1s'
             # fclone의 경우 log-level 강제설정
             if is_fclone:
-                command += ['--stats','1s','--log-level','NOTICE','--stats-log-level','NOTICE']
+                command += ['--stats',stats_interval,'--log-level','NOTICE','--stats-log-level','NOTICE']
             else:
-                command += ModelSetting.get_list('gclone_fix_option', ' ')
+                fix_option = ModelSetting.get_list('gclone_fix_option', ' ')
+                if use_rc:
+                    fix_option = GcloneRcClient.replace_stats_option(fix_option, stats_interval)
+                command += fix_option
 
             command += ModelSetting.get_list('gclone_user_option', ' ')
+            # 최근 24시간 사용량이 가장 적은 정상 계정으로 시작
+            sa_file = SAPool.get_account() if ModelSetting.get_bool('gclone_use_sa_pool') and caps['flags']['--drive-service-account-file'] else None
+            if sa_file is not None:
+                command += ['--drive-service-account-file', sa_file]
+            rc_client = None
+            if use_rc:
+                rc_client = GcloneRcClient(ModelSetting.get_int('gclone_rc_port') + worker.idx)
+                command += rc_client.get_command_option()
             logger.debug(command)         
             if app.config['config']['is_py2']:    
-                LogicGclone.current_process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, bufsize=1)
+                worker.current_process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, bufsize=1)
             else:
-                LogicGclone.current_process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+                worker.current_process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
             
-            LogicGclone.current_data['command'] = ' '.join(command)
-            LogicGclone.current_data['log'] = []
-            LogicGclone.current_data['files'] = []
-
-            LogicGclone.trans_callback('start')
-            if is_fclone:
-                LogicGclone.current_log_thread = threading.Thread(target=LogicGclone.fclone_log_thread_fuction, args=())
-            else: 
-                LogicGclone.current_log_thread = threading.Thread(target=LogicGclone.log_thread_fuction, args=())
-            LogicGclone.current_log_thread.start()
+            worker.current_data['status'] = 'is_running'
+            worker.current_data['command'] = ' '.join(command)
+            worker.job_log.close()
+            worker.job_log = GcloneJobLog(job_id)
+            worker.current_data['files'] = []
+            worker.current_data['ts'] = None
+            worker.rc_ok = False
+            worker.sa_file = sa_file
+            worker.transferred_bytes = None
+
+            LogicGclone.trans_callback(worker, 'start')
+            parser = GcloneLogParser('fclone' if is_fclone else 'gclone')
+            worker.current_log_thread = threading.Thread(target=LogicGclone.log_thread_fuction, args=(worker, parser))
+            worker.current_log_thread.start()
+            if rc_client is not None:
+                rc_thread = threading.Thread(target=LogicGclone.rc_thread_function, args=(worker, rc_client))
+                rc_thread.setDaemon(True)
+                rc_thread.start()
             logger.debug('normally process wait()')
-            ret = LogicGclone.current_process.wait()
-            LogicGclone.current_process = None
+            process = worker.current_process
+            ret = process.wait()
+            worker.current_process = None
+            # 남은 로그를 기록한 뒤 작업 로그 파일을 닫음
+            worker.current_log_thread.join(10)
+            worker.job_log.close()
+            if sa_file is not None:
+                if worker.transferred_bytes is None:
+                    worker.transferred_bytes = SAPool.parse_size(parser.ts.trans_data_current if parser.ts is not None else None)
+                SAPool.add_bytes(sa_file, worker.transferred_bytes)
+                SAPool.save_ledger(force=True)
             return ret
         except Exception as e:
             logger.error('Exception:%s', e)
@@ -263,25 +370,31 @@ service_account_file_path = {accounts_dir}/
 
 
     @staticmethod
-    def trans_callback(cmd, data=None):
+    def trans_callback(worker, cmd, data=None):
         try:
-            if data is not None:
-                if isinstance(data, FileFinished):
-                    pass
-                elif isinstance(data, TransStatus):
-                    LogicGclone.current_data['ts'] = data.__dict__
-            socketio_callback(cmd, LogicGclone.current_data)
+            if cmd == 'status':
+                if data is not None:
+                    worker.current_data['ts'] = data.__dict__
+                    LogicGclone.emitter.status(worker.idx, worker.current_data['ts'])
+            elif cmd == 'log':
+                LogicGclone.emitter.log(worker.idx, data)
+            elif cmd == 'files':
+                pass
+            else:
+                # start: 상태/명령만 즉시 전송
+                LogicGclone.emitter.reset(worker.idx)
+                socketio_callback(cmd, {'idx':worker.idx, 'status':worker.current_data['status'], 'command':worker.current_data['command']})
         except Exception as e:
             logger.error('Exception:%s', e)
             logger.error(traceback.format_exc())
 
 
     @staticmethod
-    def log_thread_fuction():
-        with LogicGclone.current_process.stdout:
-            ts = None
+    def log_thread_fuction(worker, parser):
+        process = worker.current_process
+        with process.stdout:
             iter_arg =  b'' if app.config['config']['is_py2'] else ''
-            for line in iter(LogicGclone.current_process.stdout.readline, iter_arg):
+            for line in iter(process.stdout.readline, iter_arg):
                 line = line.strip()
                 try:
                     try:
@@ -291,176 +404,64 @@ service_account_file_path = {accounts_dir}/
                             line = line.decode('cp949')
                         except Exception as e: 
                             pass
-                    #logger.debug('>>>> %s', line)
-                    if line == '' or  line.startswith('Checking'):
-                        continue
-                    if line.endswith('INFO  :'):
-                        continue
-                    if line.startswith('Deleted:'):
-                        continue
-                    if line.startswith('Transferring:'):
-                        ts.files = []
-                        continue
-                    match = re.compile(LogicGclone.trans_regexes[0]).search(line)
-                    if match:
-                        if ts is not None:
-                            LogicGclone.trans_callback('status', ts)
-                        ts = TransStatus()
-                        ts.trans_data_current = match.group('trans_data_current')
-                        ts.trans_total_size = match.group('trans_total_size')
-                        ts.trans_percent = match.group('trans_percent') if 'trans_percent' in match.groupdict() else '0'
-                        ts.trans_speed = match.group('trans_speed')
-                        ts.rt_hour = match.group('rt_hour') if 'rt_hour' in match.groupdict() else '0'
-                        ts.rt_min = match.group('rt_min') if 'rt_min' in match.groupdict() else '0'
-                        ts.rt_sec = match.group('rt_sec') if 'rt_sec' in match.groupdict() else '0'
-                        continue
-                    match = re.compile(LogicGclone.trans_regexes[1]).search(line)
-                    if match:
-                        ts.error = match.group('error')
-                        continue
-                    match = re.compile(LogicGclone.trans_regexes[2]).search(line)
-                    if match:
-                        ts.check_1 = match.group('check_1')
-                        ts.check_2 = match.group('check_2')
-                        ts.check_percent = match.group('check_percent') if 'check_percent' in match.groupdict() else '0'
-                        continue
-                    match = re.compile(LogicGclone.trans_regexes[3]).search(line)
-                    if match:
-                        ts.file_1 = match.group('file_1')
-                        ts.file_2 = match.group('file_2')
-                        ts.file_percent = match.group('file_percent') if 'file_percent' in match.groupdict() else '0'
-                        continue
-                    match = re.compile(LogicGclone.trans_regexes[4]).search(line)
-                    if match:
-                        ts.r_hour = match.group('r_hour') if 'r_hour' in match.groupdict() else '0'
-                        ts.r_min = match.group('r_min') if 'r_min' in match.groupdict() else '0'
-                        ts.r_sec = match.group('r_sec') if 'r_sec' in match.groupdict() else '0'
-                        continue
-                    
-                    
-                    match = re.compile(LogicGclone.trans_regexes[5]).search(line)
-                    if match:
-                        #ts.files.append(TransFile.get(match).__dict__)
-                        #LogicGclone.set_file(match)
-                        continue
-                    if line.startswith('Renamed:'):
-                        continue
-                    if line.find('INFO :') == -1:
-                        LogicGclone.current_data['log'].append(line)
-                        if len(LogicGclone.current_data['log']) == 1000:
-                            LogicGclone.current_data['log'] = LogicGclone.current_data['log'][100:]
-                        LogicGclone.trans_callback('log')
-                    match = re.compile(LogicGclone.trans_regexes[6]).search(line)
-                    if match:
-                        LogicGclone.trans_callback('files', FileFinished(match))
-                        continue
-                    #logger.debug('NOT PROCESS : %s', line)       
+                    for cmd, data in parser.parse(line):
+                        # rc로 상태를 받는 동안 텍스트 stats는 무시
+                        if cmd == 'status' and worker.rc_ok:
+                            continue
+                        if cmd == 'log':
+                            worker.job_log.append(data)
+                            if worker.sa_file is not None:
+                                SAPool.check_error(worker.sa_file, data)
+                        LogicGclone.trans_callback(worker, cmd, data)
                 except Exception as e:
                     logger.error('Exception:%s', e)
                     logger.error(traceback.format_exc())
             logger.debug('rclone log thread end')
-        logger.debug(str(ts))
-        LogicGclone.trans_callback('status', ts)
+        worker.job_log.flush()
+        logger.debug(str(parser.ts))
+        if not worker.rc_ok:
+            LogicGclone.trans_callback(worker, 'status', parser.ts)
 
     @staticmethod
-    def fclone_log_thread_fuction():
-        with LogicGclone.current_process.stdout:
-            ts = None
-            iter_arg =  b'' if app.config['config']['is_py2'] else ''
-            for line in iter(LogicGclone.current_process.stdout.readline, iter_arg):
-                line = line.strip()
-                try:
-                    try:
-                        line = line.decode('utf-8')
-                    except Exception as e: 
-                        try:
-                            line = line.decode('cp949')
-                        except Exception as e: 
-                            pass
-                    if line == '' or  line.startswith('Checking'):
-                        continue
-                    if line.endswith('INFO  :'):
-                        continue
-                    if line.startswith('Deleted:'):
-                        continue
-                    if line.startswith('Transferring:'):
-                        ts.files = []
-                        continue
-                    match = re.compile(LogicGclone.fclone_trans_regexes[0]).search(line)
-                    if match:
-                        #logger.debug(match.groupdict())
-                        if ts is not None:
-                            LogicGclone.trans_callback('status', ts)
-                        ts = TransStatus()
-                        ts.trans_data_current = match.group('current')
-                        ts.trans_total_size = match.group('total')
-                        ts.trans_percent = match.group('trans_percent') if 'trans_percent' in match.groupdict() else '0'
-                        ts.trans_speed = match.group('bps')
-                        ts.rt_hour = match.group('rt_hour') if 'rt_hour' in match.groupdict() else '0'
-                        ts.rt_min = match.group('rt_min') if 'rt_min' in match.groupdict() else '0'
-                        ts.rt_sec = match.group('rt_sec') if 'rt_sec' in match.groupdict() else '0'
-                        continue
-                    match = re.compile(LogicGclone.fclone_trans_regexes[1]).search(line)
-                    if match:
-                        #logger.debug(match.groupdict())
-                        #ts.trans_speed = ' / '+ match.group('fps') # not use
-                        ts.file_1 = match.group('file_1')
-                        ts.file_2 = match.group('file_2')
-                        ts.file_percent = match.group('file_percent') if 'file_percent' in match.groupdict() else '0'
-                        ts.check_1 = ts.file_1
-                        ts.check_2 = ts.file_2
-                        ts.check_percent = ts.file_percent
-                        continue
-                    match = re.compile(LogicGclone.fclone_trans_regexes[2]).search(line)
-                    if match:
-                        ts.error = match.group('error')
-                        logger.error('Errors: %s', ts.error)
-                        continue
-                    match = re.compile(LogicGclone.fclone_trans_regexes[4]).search(line)
-                    if match:
-                        ts.r_hour = match.group('r_hour') if 'r_hour' in match.groupdict() else '0'
-                        ts.r_min = match.group('r_min') if 'r_min' in match.groupdict() else '0'
-                        ts.r_sec = match.group('r_sec') if 'r_sec' in match.groupdict() else '0'
-                        continue
-
-                    # 로그를 많이 쏘면 SJVA가 뻗음
-                    """
-                    if line.find('INFO :') == -1:
-                        LogicGclone.current_data['log'].append(line)
-                        if len(LogicGclone.current_data['log']) == 1000:
-                            LogicGclone.current_data['log'] = LogicGclone.current_data['log'][100:]
-                        LogicGclone.trans_callback('log')
-                    """
-
-                    # 무시
-                    match = re.compile(LogicGclone.fclone_trans_regexes[5]).search(line)
-                    if match: 
-                        #logger.debug('>>>> %s', line)
-                        continue
-                    match = re.compile(LogicGclone.fclone_trans_regexes[6]).search(line)
-                    # 발생안함
-                    if match:
-                        LogicGclone.trans_callback('files', FileFinished(match))
-                        continue
-
-                    #logger.debug('NOT PROCESS : %s', line)       
-                except Exception as e:
-                    logger.error('Exception:%s', e)
-                    logger.error(traceback.format_exc())
-            logger.debug('rclone log thread end')
-        LogicGclone.trans_callback('status', ts)
-
-
-
-
+    def rc_thread_function(worker, rc_client):
+        # kill()이나 작업 종료로 worker.current_process가 None이 될 수 있으므로 한번만 읽음
+        process = worker.current_process
+        try:
+            while process is not None and process.poll() is None:
+                time.sleep(rc_client.interval)
+                stats = rc_client.call('core/stats')
+                if stats is None:
+                    # 연결 실패가 계속되면 텍스트 파싱으로 fallback
+                    if rc_client.fail_count >= rc_client.max_fail_count and worker.rc_ok:
+                        logger.warning('worker(%d) rc not responding, fallback to text stats', worker.idx)
+                        worker.rc_ok = False
+                    continue
+                worker.rc_ok = True
+                worker.transferred_bytes = stats.get('bytes', 0)
+                LogicGclone.trans_callback(worker, 'status', rc_client.to_trans_status(stats))
+                for item in rc_client.get_new_transferred():
+                    LogicGclone.trans_callback(worker, 'files', FileFinished(item))
+        except Exception as e:
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+        finally:
+            rc_client.close()
 
 
     @staticmethod
-    def kill():
+    def kill(worker=None):
+        # worker 미지정시 전체 중지
+        if worker is None:
+            ret = 'not_running'
+            for w in LogicGclone.workers:
+                if LogicGclone.kill(w) == 'success':
+                    ret = 'success'
+            return ret
         try:
-            if LogicGclone.current_process is not None and LogicGclone.current_process.poll() is None:
+            current = worker.current_process
+            if current is not None and current.poll() is None:
                 import psutil
-                process = psutil.Process(LogicGclone.current_process.pid)
+                process = psutil.Process(current.pid)
                 for proc in process.children(recursive=True):
                     proc.kill()
                 process.kill()
@@ -471,26 +472,12 @@ service_account_file_path = {accounts_dir}/
             logger.error(traceback.format_exc())
             return 'fail'
         finally:
-            LogicGclone.current_process = None
+            worker.current_process = None
 
 
     @staticmethod
     def is_fclone():
-        try:
-            command = [ModelSetting.get('gclone_path'), 'version']
-            if app.config['config']['is_py2']:
-                process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, bufsize=1)
-            else:
-                process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
-            ret = []
-            iter_arg =  b'' if app.config['config']['is_py2'] else ''
-            with process.stdout:
-                for line in iter(process.stdout.readline, iter_arg):
-                    if line.find('fclone') != -1: return True
-            return False
-        except Exception as e:
-            logger.error('Exception:%s', e)
-            logger.error(traceback.format_exc())
+        return GcloneCapability.get()['fork'] == 'fclone'
 
 
 
@@ -510,6 +497,166 @@ service_account_file_path = {accounts_dir}/
 
 
 
+class GcloneWorker(object):
+    def __init__(self, idx):
+        self.idx = idx
+        self.current_process = None
+        self.current_log_thread = None
+        self.rc_ok = False
+        self.sa_file = None
+        self.transferred_bytes = None
+        self.job_log = GcloneJobLog(None)
+        self.current_data = {'idx':idx, 'status':'ready', 'command':'', 'ts':None}
+
+    def as_dict(self):
+        ret = dict(self.current_data)
+        ret['log'] = self.job_log.tail()
+        ret['log_count'] = self.job_log.count
+        return ret
+
+
+
+
+class GcloneJobLog(object):
+    # 최근 로그는 메모리 ring buffer, 전체 로그는 작업별 파일에 기록하고 용량 초과시 gzip으로 회전
+    log_dir = os.path.join(path_data, package_name, 'gclone_log')
+    buffer_size = 1000
+    max_bytes = 10 * 1024 * 1024
+    backup_count = 5
+    keep_days = 3
+
+    def __init__(self, job_id):
+        self.lock = threading.Lock()
+        self.buffer = collections.deque(maxlen=GcloneJobLog.buffer_size)
+        self.count = 0
+        self.path = None
+        self.file = None
+        self.file_start = 0
+        self.file_bytes = 0
+        self.archives = []  # (path, 첫 줄 번호, 줄 수)
+        self.rotate_count = 0
+        if job_id is not None:
+            if not os.path.exists(GcloneJobLog.log_dir):
+                os.makedirs(GcloneJobLog.log_dir)
+            self.path = os.path.join(GcloneJobLog.log_dir, 'job_%s_%s.log' % (job_id, datetime.now().strftime('%Y%m%d%H%M%S')))
+
+    def append(self, line):
+        with self.lock:
+            self.buffer.append(line)
+            self.count += 1
+            if self.path is None:
+                return
+            try:
+                if self.file is None:
+                    self.file = io.open(self.path, 'a', encoding='utf-8')
+                data = u'%s\n' % line
+                self.file.write(data)
+                self.file_bytes += len(data.encode('utf-8'))
+                if self.file_bytes >= GcloneJobLog.max_bytes:
+                    self.rotate()
+            except Exception as e:
+                logger.error('Exception:%s', e)
+                logger.error(traceback.format_exc())
+
+    def rotate(self):
+        # lock 안에서 호출
+        self.file.close()
+        self.file = None
+        self.rotate_count += 1
+        archive = '%s.%d.gz' % (self.path, self.rotate_count)
+        with open(self.path, 'rb') as f_in:
+            with gzip.open(archive, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+        os.remove(self.path)
+        self.archives.append((archive, self.file_start, self.count - self.file_start))
+        self.file_start = self.count
+        self.file_bytes = 0
+        while len(self.archives) > GcloneJobLog.backup_count:
+            old = self.archives.pop(0)
+            if os.path.exists(old[0]):
+                os.remove(old[0])
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def tail(self):
+        with self.lock:
+            return list(self.buffer)
+
+    def reset_view(self):
+        with self.lock:
+            self.buffer.clear()
+
+    def page(self, offset, limit):
+        # offset: 0부터 시작하는 줄 번호
+        with self.lock:
+            first = self.archives[0][1] if self.archives else self.file_start
+            if self.path is None:
+                first = self.count - len(self.buffer)
+            offset = max(offset, first)
+            end = min(offset + limit, self.count)
+            ret = {'offset':offset, 'count':self.count, 'first':first, 'data':[]}
+            if offset >= end:
+                return ret
+            base = self.count - len(self.buffer)
+            if offset >= base:
+                ret['data'] = list(self.buffer)[offset-base:end-base]
+                return ret
+            # 현재 파일은 rotate 중에 바뀔 수 있으므로 lock 안에서 읽음
+            if self.file is not None:
+                self.file.flush()
+            current = GcloneJobLog.read_lines(self.path, self.file_start, offset, end, False)
+            archives = list(self.archives)
+        # 압축된 파일은 바뀌지 않음, 읽는 중 오래된 파일이 삭제된 경우 건너뜀
+        lines = []
+        for path, start, count in archives:
+            if start + count > offset:
+                lines += GcloneJobLog.read_lines(path, start, offset, end, True)
+        ret['data'] = lines + current
+        return ret
+
+    @staticmethod
+    def read_lines(path, start, offset, end, is_gzip):
+        lines = []
+        if start >= end or not os.path.exists(path):
+            return lines
+        try:
+            f = gzip.open(path, 'rb') if is_gzip else open(path, 'rb')
+            with f:
+                for no, line in enumerate(f, start):
+                    if no >= end:
+                        break
+                    if no >= offset:
+                        lines.append(line.decode('utf-8', 'replace').rstrip('\n'))
+        except (IOError, OSError) as e:
+            logger.error('Exception:%s', e)
+        return lines
+
+    @staticmethod
+    def cleanup():
+        try:
+            if not os.path.exists(GcloneJobLog.log_dir):
+                return
+            limit = time.time() - GcloneJobLog.keep_days * 86400
+            for fname in os.listdir(GcloneJobLog.log_dir):
+                path = os.path.join(GcloneJobLog.log_dir, fname)
+                if os.path.isfile(path) and os.path.getmtime(path) < limit:
+                    os.remove(path)
+        except Exception as e:
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+
+
+
+
 class TransStatus(object):
     def __init__(self):
         self.trans_data_current = \
@@ -532,17 +679,431 @@ class TransStatus(object):
 
 
 
+class GcloneLogParser(object):
+    # 그룹명은 dialect 공통, 패턴은 dialect별 최초 사용시 한번만 컴파일
+    regexes = {
+        'gclone' : {
+            'trans' : r'Transferred\:\s*(?P<trans_data_current>(\d.*?|off))\s\/\s(?P<trans_total_size>\d.*?)\,\s*((?P<trans_percent>\d+)\%)?\-?\,\s*(?P<trans_speed>\d.*?)\,\sETA\s(((?P<rt_hour>\d+)h)*((?P<rt_min>\d+)m)*((?P<rt_sec>.*?)s)*)?\-?',
+            'file' : r'Transferred\:\s*(?P<file_1>\d+)\s\/\s(?P<file_2>\d+)\,\s*((?P<file_percent>\d+)\%)?\-?',
+            'error' : r'Errors\:\s*(?P<error>\d+)',
+            'check' : r'Checks\:\s*(?P<check_1>\d+)\s\/\s(?P<check_2>\d+)\,\s*(?P<check_percent>\d+)?\-?',
+            'elapsed' : r'Elapsed\stime\:\s*((?P<r_hour>\d+)h)*((?P<r_min>\d+)m)*((?P<r_sec>.*?)s)*',
+            'transferring' : r'\s*\*\s((?P<folder>.*)\/)?(?P<name>.*?)\:\s*(?P<percent>\d+)\%\s*\/(?P<size>\d.*?)\,\s*(?P<speed>\d.*?)\,\s*((?P<rt_hour>\d+)h)*((?P<rt_min>\d+)m)*((?P<rt_sec>.*?)s)*',
+            'info' : r'INFO\s*\:\s*((?P<folder>.*)\/)?(?P<name>.*?)\:\s*(?P<status>.*)',
+        },
+        'fclone' : {
+            'trans' : r'Transferred:\s*(?P<trans_data_current>(\d.*?))\s*\/\s*(?P<trans_total_size>\d.*?),\s*(?P<trans_percent>\-|\d.*?)(%)?,\s*(?P<trans_speed>\d.*?Bytes/s)?,\s*ETA\s*((?P<eta1>\-)?|((?P<rt_hour>\d+)h)?((?P<rt_min>\d+)m)?((?P<rt_sec>.*?)s)?)$',
+            'file' : r'Transferred:\s*(?P<file_1>(\d.*?))\s*\/\s*(?P<file_2>\d.*?),\s*(?P<file_percent>\-|\d.*?)(%)?,\s*(?P<fps>\d.*?Files/s)?,\s*ETA\s*((?P<eta1>\-)?|((?P<rt_hour>\d+)h)?((?P<rt_min>\d+)m)?((?P<rt_sec>.*?)s)?)$',
+            'error' : r'Errors\:\s*(?P<error>\d+)',
+            'check' : r'Checks\:\s*(?P<check_1>\d+)\s\/\s(?P<check_2>\d+)\,\s*(?P<check_percent>\d+)?\-?',
+            'elapsed' : r'Elapsed\stime\:\s*((?P<r_hour>\d+)h)*((?P<r_min>\d+)m)*((?P<r_sec>.*?)s)*',
+            'transferring' : r'\s*\*\s((?P<folder>.*)\/)?(?P<name>.*?)\:\s*(?P<percent>\d+)\%\s*\/(?P<size>\d.*?)\,\s*(?P<speed>\d.*?)\,\s*((?P<rt_hour>\d+)h)*((?P<rt_min>\d+)m)*((?P<rt_sec>.*?)s)*',
+            'info' : r'INFO\s*\:\s*((?P<folder>.*)\/)?(?P<name>.*?)\:\s*(?P<status>.*)',
+        },
+    }
+    compiled = {}
+    compile_lock = threading.Lock()
+
+    @staticmethod
+    def get_compiled(dialect):
+        if dialect not in GcloneLogParser.compiled:
+            with GcloneLogParser.compile_lock:
+                if dialect not in GcloneLogParser.compiled:
+                    GcloneLogParser.compiled[dialect] = dict((k, re.compile(v)) for k, v in GcloneLogParser.regexes[dialect].items())
+        return GcloneLogParser.compiled[dialect]
+
+    def __init__(self, dialect='gclone'):
+        self.dialect = dialect
+        self.regex = GcloneLogParser.get_compiled(dialect)
+        self.ts = None
+        # fclone: 파일수로 check 표시
+        self.file_as_check = (dialect == 'fclone')
+
+    def parse(self, line):
+        # 한 줄을 처리하고 (cmd, data) 목록 반환: status, log, files
+        ret = []
+        if line == '' or line.startswith('Checking') or line.startswith('Deleted:') or line.startswith('Renamed:'):
+            return ret
+        if line.startswith('Transferring:') or line.endswith('INFO  :'):
+            return ret
+        head = line[0]
+        if head == 'T' and line.startswith('Transferred:'):
+            match = self.regex['trans'].search(line)
+            if match:
+                if self.ts is not None:
+                    ret.append(('status', self.ts))
+                self.ts = TransStatus()
+                d = match.groupdict()
+                self.ts.trans_data_current = d['trans_data_current']
+                self.ts.trans_total_size = d['trans_total_size']
+                self.ts.trans_percent = d.get('trans_percent', '0')
+                self.ts.trans_speed = d['trans_speed']
+                self.ts.rt_hour = d.get('rt_hour', '0')
+                self.ts.rt_min = d.get('rt_min', '0')
+                self.ts.rt_sec = d.get('rt_sec', '0')
+                return ret
+            match = self.regex['file'].search(line)
+            if match:
+                if self.ts is not None:
+                    d = match.groupdict()
+                    self.ts.file_1 = d['file_1']
+                    self.ts.file_2 = d['file_2']
+                    self.ts.file_percent = d.get('file_percent', '0')
+                    if self.file_as_check:
+                        self.ts.check_1 = self.ts.file_1
+                        self.ts.check_2 = self.ts.file_2
+                        self.ts.check_percent = self.ts.file_percent
+                return ret
+        elif head == 'E' and line.startswith('Errors:'):
+            match = self.regex['error'].search(line)
+            if match:
+                if self.ts is not None:
+                    self.ts.error = match.group('error')
+                    if self.dialect == 'fclone':
+                        logger.error('Errors: %s', self.ts.error)
+                return ret
+        elif head == 'C' and line.startswith('Checks:'):
+            match = self.regex['check'].search(line)
+            if match:
+                if self.ts is not None:
+                    d = match.groupdict()
+                    self.ts.check_1 = d['check_1']
+                    self.ts.check_2 = d['check_2']
+                    self.ts.check_percent = d.get('check_percent', '0')
+                return ret
+        elif head == 'E' and line.startswith('Elapsed time:'):
+            match = self.regex['elapsed'].search(line)
+            if match:
+                if self.ts is not None:
+                    d = match.groupdict()
+                    self.ts.r_hour = d.get('r_hour', '0')
+                    self.ts.r_min = d.get('r_min', '0')
+                    self.ts.r_sec = d.get('r_sec', '0')
+                return ret
+        elif head == '*':
+            # 전송중인 파일: 무시
+            if self.regex['transferring'].search(line):
+                return ret
+
+        if line.find('INFO :') == -1:
+            ret.append(('log', line))
+        if line.find('INFO') != -1:
+            match = self.regex['info'].search(line)
+            if match:
+                ret.append(('files', FileFinished(match)))
+        return ret
+
+
+
+
+
+
+class GcloneEmitter(object):
+    # 진행상황/로그를 모아서 최대 gclone_emit_rate(Hz)로 변경된 값만 전송
+    idle_limit = 10
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pending_ts = {}
+        self.pending_log = {}
+        self.last_ts = {}
+
+    def reset(self, idx):
+        # 이전 작업의 마지막 상태/로그를 먼저 전송한 뒤 초기화
+        self.flush(idx)
+        with self.lock:
+            self.last_ts.pop(idx, None)
+
+    def status(self, idx, ts):
+        with self.lock:
+            self.pending_ts[idx] = dict(ts)
+            self.start_thread()
+
+    def log(self, idx, line):
+        with self.lock:
+            self.pending_log.setdefault(idx, []).append(line)
+            self.start_thread()
+
+    def start_thread(self):
+        # lock 안에서 호출
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.thread_function, args=())
+            self.thread.setDaemon(True)
+            self.thread.start()
+
+    def thread_function(self):
+        rate = ModelSetting.get_int('gclone_emit_rate')
+        interval = 1.0 / rate if rate is not None and rate > 0 else 0.5
+        idle = 0
+        while True:
+            time.sleep(interval)
+            if self.flush():
+                idle = 0
+                continue
+            idle += 1
+            if idle >= GcloneEmitter.idle_limit:
+                with self.lock:
+                    if not self.pending_ts and not self.pending_log:
+                        self.thread = None
+                        return
+
+    def flush(self, target=None):
+        # target: 지정한 worker만 전송
+        payloads = []
+        with self.lock:
+            for idx in set(self.pending_ts.keys()) | set(self.pending_log.keys()):
+                if target is not None and idx != target:
+                    continue
+                payload = {'idx':idx}
+                ts = self.pending_ts.pop(idx, None)
+                if ts is not None:
+                    last = self.last_ts.get(idx, {})
+                    delta = dict((k, v) for k, v in ts.items() if k not in last or last[k] != v)
+                    if delta:
+                        payload['ts'] = delta
+                        self.last_ts[idx] = ts
+                lines = self.pending_log.pop(idx, None)
+                if lines:
+                    payload['log'] = lines
+                if len(payload) > 1:
+                    payloads.append(payload)
+        for payload in payloads:
+            socketio_callback('update', payload)
+        return len(payloads) > 0
+
+
+
+
+
+
+class GcloneCapability(object):
+    # 바이너리(경로, mtime, 크기)별로 version/help flags를 한번만 실행해서 기능 확인
+    flags = ['--rc', '--use-json-log', '--drive-service-account-file']
+    version_regex = re.compile(r'v\d+\.\d+[\w\.\-]*')
+    cache = {}
+    lock = threading.Lock()
+    timeout = 10
+
+    @staticmethod
+    def resolve(path):
+        # 경로 없이 명령어만 지정한 경우(fclone 등) PATH에서 찾음
+        if os.path.dirname(path) != '' or os.path.exists(path):
+            return path
+        try:
+            from shutil import which
+        except ImportError:
+            from distutils.spawn import find_executable as which
+        return which(path) or path
+
+    @staticmethod
+    def get(path=None):
+        if path is None:
+            path = ModelSetting.get('gclone_path')
+        path = GcloneCapability.resolve(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            logger.error('gclone not found: %s', path)
+            return GcloneCapability.get_default()
+        key = (path, stat.st_mtime, stat.st_size)
+        with GcloneCapability.lock:
+            if key in GcloneCapability.cache:
+                return GcloneCapability.cache[key]
+        # 실행은 lock 밖에서, 응답이 없는 바이너리는 timeout 후 종료
+        ret = GcloneCapability.probe(path)
+        if len(ret['lines']) == 0:
+            return ret
+        with GcloneCapability.lock:
+            # 바이너리가 바뀌면 이전 결과는 버림
+            for old in [x for x in GcloneCapability.cache.keys() if x[0] == path]:
+                del GcloneCapability.cache[old]
+            GcloneCapability.cache[key] = ret
+        return ret
+
+    @staticmethod
+    def get_default():
+        return {'fork':'gclone', 'version':None, 'lines':[], 'flags':dict((x, True) for x in GcloneCapability.flags)}
+
+    @staticmethod
+    def run(command):
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+            timer = threading.Timer(GcloneCapability.timeout, GcloneCapability.kill, args=(process,))
+            timer.start()
+            try:
+                output = process.communicate()[0]
+            finally:
+                timer.cancel()
+            return output.splitlines(True)
+        except Exception as e:
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+            return []
+
+    @staticmethod
+    def kill(process):
+        # 하위 프로세스가 stdout을 잡고 있으면 communicate가 끝나지 않으므로 함께 종료
+        try:
+            import psutil
+            parent = psutil.Process(process.pid)
+            for proc in parent.children(recursive=True):
+                proc.kill()
+            parent.kill()
+            logger.error('gclone probe timeout: %s', process.args if hasattr(process, 'args') else process.pid)
+        except Exception as e:
+            logger.error('Exception:%s', e)
+
+    @staticmethod
+    def probe(path):
+        ret = GcloneCapability.get_default()
+        ret['lines'] = GcloneCapability.run([path, 'version'])
+        if len(ret['lines']) == 0:
+            return ret
+        text = ''.join(ret['lines'])
+        if text.find('fclone') != -1:
+            ret['fork'] = 'fclone'
+        elif text.find('gclone') != -1:
+            ret['fork'] = 'gclone'
+        elif text.find('rclone') != -1:
+            ret['fork'] = 'rclone'
+        match = GcloneCapability.version_regex.search(text)
+        if match:
+            ret['version'] = match.group(0)
+        # help flags가 없는 경우 기존처럼 설정대로 사용
+        help_text = ''.join(GcloneCapability.run([path, 'help', 'flags']))
+        if help_text.find('--') != -1:
+            ret['flags'] = dict((x, help_text.find(x) != -1) for x in GcloneCapability.flags)
+        logger.debug('gclone capability: %s %s %s %s', path, ret['fork'], ret['version'], ret['flags'])
+        return ret
+
+
+class GcloneRcClient(object):
+    # rclone remote control api: --rc 로 실행한 프로세스의 core/stats, core/transferred 조회
+    interval = 1
+    max_fail_count = 5
+    fallback_stats_interval = '10s'
+    units = ['Bytes', 'kBytes', 'MBytes', 'GBytes', 'TBytes', 'PBytes']
+
+    def __init__(self, port):
+        self.port = port
+        self.url = 'http://127.0.0.1:%d/' % port
+        self.session = requests.Session()
+        self.fail_count = 0
+        self.transferred = set()
+
+    def get_command_option(self):
+        return ['--rc', '--rc-addr', '127.0.0.1:%d' % self.port, '--rc-no-auth']
+
+    @staticmethod
+    def replace_stats_option(options, interval):
+        ret = []
+        skip = False
+        for opt in options:
+            if skip:
+                skip = False
+                continue
+            if opt == '--stats':
+                skip = True
+                continue
+            if opt.startswith('--stats='):
+                continue
+            ret.append(opt)
+        return ret + ['--stats', interval]
+
+    def call(self, method):
+        try:
+            res = self.session.post(self.url + method, json={}, timeout=3)
+            res.raise_for_status()
+            self.fail_count = 0
+            return res.json()
+        except Exception as e:
+            self.fail_count += 1
+            return None
+
+    def close(self):
+        try:
+            self.session.close()
+        except Exception as e:
+            pass
+
+    def get_new_transferred(self):
+        ret = []
+        data = self.call('core/transferred')
+        if data is None or data.get('transferred') is None:
+            return ret
+        for item in data['transferred']:
+            key = (item.get('name'), item.get('completed_at', item.get('timestamp')))
+            if key in self.transferred:
+                continue
+            self.transferred.add(key)
+            name = item.get('name', '')
+            folder, name = name.rsplit('/', 1) if name.find('/') != -1 else ('', name)
+            status = item.get('error') if item.get('error') else ('Checked' if item.get('checked') else 'Copied')
+            ret.append({'folder':folder, 'name':name, 'status':status})
+        return ret
+
+    @staticmethod
+    def format_size(size):
+        size = float(size or 0)
+        for unit in GcloneRcClient.units:
+            if size < 1024 or unit == GcloneRcClient.units[-1]:
+                return '%.3f %s' % (size, unit) if unit != 'Bytes' else '%d %s' % (size, unit)
+            size = size / 1024
+
+    @staticmethod
+    def split_time(seconds):
+        if seconds is None:
+            return None, None, None
+        seconds = int(seconds)
+        return str(seconds // 3600), str((seconds % 3600) // 60), str(seconds % 60)
+
+    @staticmethod
+    def get_percent(current, total):
+        if not total:
+            return '0'
+        return str(int(current * 100 / total))
+
+    @staticmethod
+    def to_trans_status(stats):
+        ts = TransStatus()
+        current = stats.get('bytes', 0)
+        total = stats.get('totalBytes', 0)
+        ts.trans_data_current = GcloneRcClient.format_size(current)
+        ts.trans_total_size = GcloneRcClient.format_size(total)
+        ts.trans_percent = GcloneRcClient.get_percent(current, total)
+        ts.trans_speed = GcloneRcClient.format_size(stats.get('speed', 0)) + '/s'
+        ts.rt_hour, ts.rt_min, ts.rt_sec = GcloneRcClient.split_time(stats.get('eta'))
+        ts.error = str(stats.get('errors', 0))
+        ts.check_1 = str(stats.get('checks', 0))
+        ts.check_2 = str(stats.get('totalChecks', 0))
+        ts.check_percent = GcloneRcClient.get_percent(stats.get('checks', 0), stats.get('totalChecks', 0))
+        ts.file_1 = str(stats.get('transfers', 0))
+        ts.file_2 = str(stats.get('totalTransfers', 0))
+        ts.file_percent = GcloneRcClient.get_percent(stats.get('transfers', 0), stats.get('totalTransfers', 0))
+        ts.r_hour, ts.r_min, ts.r_sec = GcloneRcClient.split_time(stats.get('elapsedTime'))
+        return ts
+
+
+
+
+
+
 class FileFinished(object):
     def __init__(self, match):
-        self.folder = match.group('folder') if 'folder' in match.groupdict() else ''
-        self.name = match.group('name')
-        self.status = match.group('status')
+        # match: 정규식 match 또는 rc core/transferred 항목(dict)
+        d = match.groupdict() if hasattr(match, 'groupdict') else match
+        self.folder = d['folder'] if 'folder' in d else ''
+        self.name = d['name']
+        self.status = d['status']
+
 
 
 
 
 
 
+LogicGclone.emitter = GcloneEmitter()
 
 #########################################################
 # socketio / sub
@@ -554,8 +1115,7 @@ def connect():
     try:
         logger.debug('socket_connect')
         sid_list.append(request.sid)
-        #socketio_callback('start', LogicGclone.current_data)
-        socketio_callback('connect',LogicGclone.current_data)
+        socketio_callback('connect', LogicGclone.get_data())
     except Exception as e: 
         logger.error('Exception:%s', e)
         logger.error(traceback.format_exc())
@@ -571,7 +1131,7 @@ def disconnect():
         logger.error(traceback.format_exc())
 
 
-def socketio_callback(cmd, data, encoding=True):
+def socketio_callback(cmd, data, encoding=False):
     if sid_list:
         if encoding:
             data = json.dumps(data, cls=AlchemyEncoder)
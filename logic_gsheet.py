@@ -12,6 +12,9 @@ import threading
 import json
 import platform
 import shutil
+import collections
+from multiprocessing.pool import ThreadPool
+import hashlib
 
 # third-party
 from flask import Blueprint, request, Response, send_file, render_template, redirect, jsonify
@@ -29,43 +32,83 @@ from rclone_expand.model import ModelSetting
 
 # 패키지
 from .plugin import logger, package_name
-from .model import ModelSetting, WSModelItem, ListModelItem
+from .model import ModelSetting, WSModelItem, ListModelItem, ModelDriveCache
 from .logic_gclone import LogicGclone
+from .logic_autorclone import SAPool
 
 #########################################################
 class LogicGSheet(object):
     # for GoogleDrive APIs
     scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-    credentials = None
-    service = None
+    # 현재 계정 (json_file, credentials): 여러 스레드에서 읽으므로 한번에 교체
+    account = None
+    auth_lock = threading.Lock()
+    # Drive batch 요청당 최대 호출수
+    batch_size = 100
     
+    # 이전 스케쥴 실행이 끝나지 않은 경우 다음 실행 skip
+    scheduler_lock = threading.Lock()
+    # 일괄 작업(reset_db, size_migration 등) 상태
+    task_lock = threading.Lock()
+    task_status = {'status':'ready', 'type':'', 'current':0, 'total':0, 'count':0}
+    # 시트 write-back 큐: sheet_id -> folder_id -> {컬럼명:값}
+    writeback_lock = threading.Lock()
+    writeback_queue = {}
+    writeback_thread = None
+    writeback_attempts = {}
+    writeback_max_attempts = 3
+    # sheet_id -> {'cols':컬럼명->열, ...}, 행번호는 flush 마다 다시 읽음
+    writeback_cols = {}
+    writeback_cols_ttl = 600
+
     @staticmethod
     @celery.task
     def scheduler_function():
+        if not LogicGSheet.scheduler_lock.acquire(False):
+            logger.info('SKIP: previous GSheet Scheduler-function is running')
+            return
         try:
             logger.info('GSheet Scheduler-function started')
             LogicGSheet.google_api_auth()
 
-            for wsentity in WSModelItem.get_scheduled_list():
-                if wsentity.is_running:
-                    logger.info('SKIP: sheet_id(%d) is running', wsentity.id)
-                    continue
-
-                # reload items
-                LogicGSheet.load_items(wsentity.id)
-
-                def func():
-                    ret = LogicGSheet.scheduled_copy(wsentity.id)
-
-                thread = threading.Thread(target=func, args=())
-                thread.setDaemon(True)
-                thread.start()            
+            sheet_ids = [wsentity.id for wsentity in WSModelItem.get_scheduled_list()]
+            worker_count = max(1, min(ModelSetting.get_int('gsheet_worker_count') or 1, len(sheet_ids)))
+            if len(sheet_ids) > 0:
+                pool = ThreadPool(worker_count)
+                try:
+                    pool.map(LogicGSheet.scheduled_sheet_job, sheet_ids)
+                finally:
+                    pool.close()
+                    pool.join()
 
             logger.info('GSheet Scheduler-function ended')
 
         except Exception as e: 
             logger.error('Exception:%s', e)
             logger.error(traceback.format_exc())
+        finally:
+            LogicGSheet.scheduler_lock.release()
+
+    @staticmethod
+    def scheduled_sheet_job(sheet_id):
+        # 시트별 lease를 잡고 목록갱신 후 복사
+        try:
+            if not WSModelItem.acquire_lease(sheet_id):
+                logger.info('SKIP: sheet_id(%d) is running', sheet_id)
+                return
+            try:
+                LogicGSheet.load_items(sheet_id)
+                # 단계 사이에 lease 연장, 복사 중에는 scheduled_copy에서 연장
+                WSModelItem.renew_lease(sheet_id)
+                LogicGSheet.scheduled_copy(sheet_id, lease=False)
+            finally:
+                WSModelItem.release_lease(sheet_id)
+        except Exception as e: 
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+        finally:
+            # pool 스레드별 scoped session 정리
+            db.session.remove()
 
     @staticmethod
     def process_ajax(sub, req):
@@ -92,9 +135,14 @@ class LogicGSheet(object):
                 return jsonify(ret)
             elif sub == 'load_items':
                 id= req.form['id']
+                if not WSModelItem.acquire_lease(id):
+                    return jsonify({'ret':False, 'data':'워크시트 작업이 실행중입니다.'})
                 def func():
-                    time.sleep(1)
-                    LogicGSheet.load_items(id)
+                    try:
+                        time.sleep(1)
+                        LogicGSheet.load_items(id, force=True)
+                    finally:
+                        WSModelItem.release_lease(id)
                 threading.Thread(target=func, args=()).start()
 
                 ret = {'ret':True, 'data':'아이템 목록 갱신을 요청했습니다.'}
@@ -129,6 +177,18 @@ class LogicGSheet(object):
             elif sub == 'size_migration':
                 ret = LogicGSheet.size_migration()
                 return jsonify(ret)
+            elif sub == 'get_sheet_size':
+                id= req.form['id']
+                ret = LogicGSheet.get_sheet_size(id)
+                return jsonify(ret)
+            elif sub == 'task_status':
+                return jsonify(LogicGSheet.task_status)
+            elif sub == 'cache_clear':
+                if ModelDriveCache.clear():
+                    ret = {'ret':True, 'data':'Drive 정보 캐시를 삭제하였습니다.'}
+                else:
+                    ret = {'ret':False, 'data':'캐시 삭제에 실패하였습니다.'}
+                return jsonify(ret)
 
         except Exception as e: 
             logger.error('Exception:%s', e)
@@ -137,21 +197,28 @@ class LogicGSheet(object):
             return jsonify(ret)
     
     @staticmethod
-    def google_api_auth():
-        json_file = LogicGSheet.get_random_json()
-        try:
-            from oauth2client.service_account import ServiceAccountCredentials
-        except ImportError:
-            os.system("{} install oauth2client".format(app.config['config']['pip']))
-            from oauth2client.service_account import ServiceAccountCredentials
-        try:
-            from googleapiclient.discovery import build
-        except ImportError:
-            os.system("{} install googleapiclient".format(app.config['config']['pip']))
-            from googleapiclient.discovery import build
-            
-        LogicGSheet.credentials = ServiceAccountCredentials.from_json_keyfile_name(json_file, LogicGSheet.scope)
-        LogicGSheet.service = build('drive',  'v3', credentials=LogicGSheet.credentials)
+    def google_api_auth(current=None):
+        # 사용할 계정만 선택, Drive client는 get_service()에서 스레드별로 생성/재사용
+        # current: 오류가 난 계정, 다른 스레드가 이미 교체했으면 다시 바꾸지 않음
+        with LogicGSheet.auth_lock:
+            if current is not None and LogicGSheet.account is not None and LogicGSheet.account[0] != current:
+                return LogicGSheet.account
+            json_file = LogicGSheet.get_random_json()
+            LogicGSheet.account = (json_file, GoogleClientFactory.get_credentials(json_file, LogicGSheet.scope))
+            return LogicGSheet.account
+
+    @staticmethod
+    def get_account():
+        account = LogicGSheet.account
+        if account is None:
+            account = LogicGSheet.google_api_auth()
+        return account
+
+    @staticmethod
+    def get_service(json_file=None):
+        if json_file is None:
+            json_file = LogicGSheet.get_account()[0]
+        return GoogleClientFactory.get_service(json_file, LogicGSheet.scope)
 
     @staticmethod
     def validate_sheet(ws):
@@ -162,42 +229,87 @@ class LogicGSheet(object):
 
     @staticmethod
     def get_first_json():
-        accounts_dir = ModelSetting.get('path_accounts')
-        for (path, dir, files) in os.walk(accounts_dir):
-            for fname in files:
-                if os.path.splitext(fname)[-1] == '.json':
-                    return os.path.join(path, fname)
-        return None
+        return SAPool.get_first()
 
     @staticmethod
     def get_random_json():
-        import random
-        accounts_dir = ModelSetting.get('path_accounts')
-        sa_files = []
-        for (path, dir, files) in os.walk(accounts_dir):
-            for fname in files:
-                if os.path.splitext(fname)[-1] == '.json':
-                    sa_files.append(fname)
-
-        if len(sa_files) == 0: return None
-        idx = int(random.random() * len(sa_files))
-        return os.path.join(accounts_dir, sa_files[idx])
+        # 최근 24시간 사용량이 가장 적은 정상 계정
+        return SAPool.get_account()
 
     @staticmethod
     def get_file_info(file_id):
+        return LogicGSheet.get_files_info([file_id]).get(file_id)
+
+    @staticmethod
+    def get_doc_version(doc_id):
         try:
-            service = LogicGSheet.service
-            finfo = service.files().get(fileId=file_id, fields="mimeType, size",
+            service = LogicGSheet.get_service()
+            finfo = service.files().get(fileId=doc_id, fields="version, modifiedTime",
                     supportsTeamDrives=True,
                     supportsAllDrives=True).execute()
-            return finfo
+            return u'{}/{}'.format(finfo.get('version', ''), finfo.get('modifiedTime', ''))
         except Exception as e:
             logger.error('Exception:%s', e)
             logger.error(traceback.format_exc())
             return None
 
+    @staticmethod
+    def get_files_info(file_ids):
+        # 캐시에 없는 ID만 Drive batch api로 batch_size개씩 조회, 실패한 ID는 None
+        ret = {}
+        fetched = {}
+        errors = {}
+        quota_errors = []
+        def callback(request_id, response, exception):
+            if exception is not None:
+                logger.error('Exception:%s', exception)
+                ret[request_id] = None
+                if SAPool.check_error(json_file, str(exception), code=getattr(getattr(exception, 'resp', None), 'status', None)):
+                    quota_errors.append(request_id)
+                # 없는 ID만 실패 캐시, 일시적인 오류는 다음에 재시도
+                if getattr(getattr(exception, 'resp', None), 'status', None) == 404:
+                    errors[request_id] = exception
+            else:
+                ret[request_id] = response
+                fetched[request_id] = response
+
+        file_ids = list(collections.OrderedDict.fromkeys(file_ids))
+        ttl = ModelSetting.get_int('gsheet_cache_ttl')
+        negative_ttl = ModelSetting.get_int('gsheet_cache_negative_ttl')
+        use_cache = ttl is not None and ttl > 0
+        if use_cache:
+            ret.update(ModelDriveCache.get_valid(file_ids, ttl, negative_ttl if negative_ttl is not None else 0))
+            file_ids = [x for x in file_ids if x not in ret]
+
+        json_file = LogicGSheet.get_account()[0]
+        service = LogicGSheet.get_service(json_file)
+        for i in range(0, len(file_ids), LogicGSheet.batch_size):
+            chunk = file_ids[i:i+LogicGSheet.batch_size]
+            try:
+                batch = service.new_batch_http_request(callback=callback)
+                for file_id in chunk:
+                    batch.add(service.files().get(fileId=file_id, fields="mimeType, size, modifiedTime",
+                        supportsTeamDrives=True,
+                        supportsAllDrives=True), request_id=file_id)
+                batch.execute()
+            except Exception as e:
+                logger.error('Exception:%s', e)
+                logger.error(traceback.format_exc())
+                for file_id in chunk:
+                    if file_id not in ret:
+                        ret[file_id] = None
+
+        if quota_errors:
+            # 할당량 오류시 다른 계정으로 교체, 실패한 ID는 다음 조회시 재시도
+            LogicGSheet.google_api_auth(current=json_file)
+        if use_cache and (fetched or errors):
+            ModelDriveCache.put(fetched, errors)
+            ModelDriveCache.evict(ttl, negative_ttl if negative_ttl is not None else 0, ModelSetting.get_int('gsheet_cache_max_entries') or 0)
+        return ret
+
     @staticmethod
     def search_gsheet(doc_id):
+        doc_url = None
         try:
             ret = []
             logger.debug('start to search_gsheet: %s', doc_id)
@@ -210,15 +322,8 @@ class LogicGSheet(object):
             else: doc_url = 'https://docs.google.com/spreadsheets/d/{doc_id}'.format(doc_id=doc_id)
             logger.debug('url(%s)', doc_url)
 
-            try:
-                import gspread
-            except ImportError:
-                os.system("{} install gspread".format(app.config['config']['pip']))
-                import gspread
-
-            gsp = gspread.authorize(LogicGSheet.credentials)
-            doc = gsp.open_by_url(doc_url)
-            for ws in doc.worksheets():
+            doc, worksheets = GSpreadCache.open(doc_url, refresh=True)
+            for ws in worksheets.values():
                 if LogicGSheet.validate_sheet(ws):
                     ret.append({'doc_id':doc.id, 'doc_title':doc.title, 'doc_url':doc_url,
                         'ws_id':ws.id, 'ws_title':ws.title})
@@ -227,6 +332,7 @@ class LogicGSheet(object):
         except Exception as e:
             logger.error('Exception:%s', e)
             logger.error(traceback.format_exc())
+            GSpreadCache.invalidate(doc_url, e)
             return []
 
     @staticmethod
@@ -245,30 +351,35 @@ class LogicGSheet(object):
             return 'Failed'
 
     @staticmethod
-    def get_worksheet(doc, wsmodel_id):
+    def get_worksheet(doc_url, wsmodel_id):
+        # 캐시된 워크시트 목록에 없으면 새로 읽어서 한번 더 확인
         try:
-            for ws in doc.worksheets():
-                if ws.id == wsmodel_id:
-                    return ws
-            return None
+            doc, worksheets = GSpreadCache.open(doc_url)
+            if wsmodel_id not in worksheets:
+                doc, worksheets = GSpreadCache.open(doc_url, refresh=True)
+            return worksheets.get(wsmodel_id)
         except Exception as e:
             logger.error('Exception:%s', e)
             logger.error(traceback.format_exc())
+            GSpreadCache.invalidate(doc_url, e)
             return None
 
     @staticmethod
-    def load_items(wsmodel_id):
+    def load_items(wsmodel_id, force=False):
+        doc_url = None
         try:
             ret = []
             wsentity = WSModelItem.get(wsmodel_id)
             if wsentity is None:
                 data = {'type':'warning', 'msg':'유효한 워크시트가 아닙니다.'}
-                socketio.emit("notify", data, namespace='/framework', broadcate=True)
+                socketio.emit("notify", data, namespace='/framework', broadcast=True)
                 return
 
-            # 목록이 삭제된 경우 업데이트
+            # 목록이 삭제된 경우 업데이트: 시트가 그대로여도 다시 읽어야 함
             if wsentity.total_count > 0:
-                wsentity.total_count = ListModelItem.get_total_count(wsentity.id)
+                total_count = ListModelItem.get_total_count(wsentity.id)
+                if total_count != wsentity.total_count: force = True
+                wsentity.total_count = total_count
                 wsentity.copy_count = ListModelItem.get_copy_count(wsentity.id)
                 wsentity.save()
 
@@ -283,15 +394,16 @@ class LogicGSheet(object):
             """
             doc_url = wsentity.doc_url
 
-            try:
-                import gspread
-            except ImportError:
-                os.system("{} install gspread".format(app.config['config']['pip']))
-                import gspread
-
-            gsp = gspread.authorize(LogicGSheet.credentials)
-            doc = gsp.open_by_url(doc_url)
-            ws = LogicGSheet.get_worksheet(doc, ws_id)
+            # 문서 버전이 그대로면 시트를 읽지 않음
+            doc_version = LogicGSheet.get_doc_version(doc_id)
+            if not force and doc_version is not None and doc_version == wsentity.doc_version:
+                logger.info('SKIP: sheet_id(%d) not changed(version:%s)', wsentity.id, doc_version)
+                return
+
+            ws = LogicGSheet.get_worksheet(doc_url, ws_id)
+            if ws is None:
+                logger.error('worksheet not found: sheet_id(%d)', wsentity.id)
+                return
             count = 0
             scount = 0
             ucount = 0
@@ -299,6 +411,24 @@ class LogicGSheet(object):
             all_records = ws.get_all_records(head=1)
             col_values  = ws.col_values(2)
             total = len(all_records)
+
+            # 워크시트 내용이 그대로면 스킵(다른 워크시트만 변경된 경우)
+            fingerprints = [ListModelItem.get_fingerprint(r) for r in all_records]
+            content_hash = hashlib.md5(u''.join(fingerprints).encode('utf-8')).hexdigest()
+            if not force and content_hash == wsentity.content_hash:
+                logger.info('SKIP: sheet_id(%d) not changed(content)', wsentity.id)
+                wsentity.doc_version = doc_version
+                wsentity.save()
+                return
+
+            # 기존 아이템: folder_id -> row
+            folder_map = ListModelItem.get_folder_map([r[u'폴더 ID'] for r in all_records if r.get(u'폴더 ID', '') != ''])
+            if folder_map is None:
+                return
+
+            # 1차: 시트 정보만으로 처리할 항목 선별
+            targets = []
+            updates = []
             for r in all_records:
                 #logger.debug(r)
                 curr += 1
@@ -311,27 +441,19 @@ class LogicGSheet(object):
                     byte_size = LogicGSheet.get_byte_size(r[u'사이즈'])
                     str_size  = LogicGSheet.get_str_size(byte_size)
                     obj_num   = LogicGSheet.get_obj_num(r[u'파일수'])
-                    title     = r[u'제목']
 
-                    entity = ListModelItem.get_entity_by_folder_id(folder_id)
-                    if entity is not None:
-                        if byte_size == entity.byte_size and obj_num == entity.obj_num:
+                    fingerprint = fingerprints[curr-1]
+                    row = folder_map.get(folder_id)
+                    if row is not None:
+                        if fingerprint == row['fingerprint']:
+                            scount += 1
+                            continue
+                        # fingerprint가 없는 기존 항목: fingerprint만 기록
+                        if row['fingerprint'] is None and byte_size == row['byte_size'] and obj_num == row['obj_num']:
+                            updates.append({'id':row['id'], 'fingerprint':fingerprint})
+                            row['fingerprint'] = fingerprint
                             scount += 1
                             continue
-
-                    # 파일/폴더 구분
-                    finfo = LogicGSheet.get_file_info(folder_id)
-                    if finfo is None:
-                        logger.error('failed to get info of %s', folder_id)
-                        scount += 1
-                        continue
-
-                    mimetype = 0
-                    if finfo['mimeType'] != "application/vnd.google-apps.folder":
-                        mimetype = 1
-                        logger.debug('INFO(%03d/%03d): %s: type(file), title(%s), size(%s), objnum(1)', curr, total, folder_id, title, str_size)
-                    else:
-                        logger.debug('INFO(%03d/%03d): %s: type(folder), title(%s), size(%s), objnum(%d)', curr, total, folder_id, title, str_size, obj_num)
 
                     # 파일수0, 사이즈 0Bytes인경우 스킵
                     if obj_num == 0 and (str_size == u'0 Bytes' or byte_size == 0) and str_size != '-':
@@ -340,39 +462,78 @@ class LogicGSheet(object):
 
                     info = {'sheet_id':wsmodel_id, 
                             'title':r[u'제목'], 
-                            'folder_id':r[u'폴더 ID'], 
-                            'mimetype':mimetype,
+                            'folder_id':folder_id, 
                             'category':r[u'분류'], 
                             'title2':r[u'제목 매핑'],
                             'obj_num':obj_num,
                             'str_size':str_size,
-                            'byte_size':byte_size}
-
-                    entity = ListModelItem.get_entity_by_folder_id(info['folder_id'])
-                    if entity is not None:
-                        updated = ListModelItem.update_with_info(entity.id, info)
-                        if updated: ucount += 1
-                        else: scount += 1
-                    else:
-                        entity = ListModelItem.create(info)
-                        if entity is None:
-                            #logger.debug('already exist item(folder_id:%s)', info['folder_id'])
-                            scount += 1
-                            continue
-                        count += 1
+                            'byte_size':byte_size,
+                            'fingerprint':fingerprint}
+                    targets.append((curr, info))
 
                 except KeyError:
                     logger.error('failed to get item info')
                     logger.error(r)
                     continue
 
+            # 파일/폴더 구분: 신규 항목만 batch 조회(기존 항목의 mimetype은 바뀌지 않음)
+            finfos = LogicGSheet.get_files_info([info['folder_id'] for curr, info in targets if info['folder_id'] not in folder_map])
+            # 조회가 오래 걸릴 수 있으므로 lease 연장(lease를 잡지 않은 경우 변화 없음)
+            WSModelItem.renew_lease(wsmodel_id)
+
+            # 2차: 추가/갱신 목록을 만들어 한번에 저장
+            inserts = []
+            inserted = set()
+            failed = 0
+            for curr, info in targets:
+                folder_id = info['folder_id']
+                row = folder_map.get(folder_id)
+                if row is not None:
+                    changed = ListModelItem.get_changed_info(row, info)
+                    if changed is not None:
+                        updates.append(changed)
+                        row.update(changed)
+                        ucount += 1
+                    else: scount += 1
+                    continue
+
+                if folder_id in inserted:
+                    #logger.debug('already exist item(folder_id:%s)', info['folder_id'])
+                    scount += 1
+                    continue
+
+                finfo = finfos.get(folder_id)
+                if finfo is None:
+                    logger.error('failed to get info of %s', folder_id)
+                    failed += 1
+                    scount += 1
+                    continue
+
+                info['mimetype'] = 0
+                if finfo['mimeType'] != "application/vnd.google-apps.folder":
+                    info['mimetype'] = 1
+                    logger.debug('INFO(%03d/%03d): %s: type(file), title(%s), size(%s), objnum(1)', curr, total, folder_id, info['title'], info['str_size'])
+                else:
+                    logger.debug('INFO(%03d/%03d): %s: type(folder), title(%s), size(%s), objnum(%d)', curr, total, folder_id, info['title'], info['str_size'], info['obj_num'])
+
+                inserts.append(ListModelItem.get_insert_mapping(info))
+                inserted.add(folder_id)
+                count += 1
+
+            if not ListModelItem.bulk_upsert(inserts, updates):
+                logger.error('failed to save items: sheet_id(%d)', wsentity.id)
+                return
+
             wsentity.updated_time = datetime.now()
             wsentity.total_count += count
+            # 조회 실패 항목이 있으면 다음 실행시 다시 읽도록 hash를 남기지 않음
+            wsentity.doc_version = doc_version if failed == 0 else None
+            wsentity.content_hash = content_hash if failed == 0 else None
             wsentity.save()
 
             # 결과 notify
             data = {'type':'success', 'msg':'<strong>워크시트({ws})에 {count} 항목을 추가하였습니다</strong><br>(갱신: {ucount}, 스킵: {scount}건)'.format(ws=wsentity.doc_title, count=count, ucount=ucount, scount=scount)}
-            socketio.emit("notify", data, namespace='/framework', broadcate=True)
+            socketio.emit("notify", data, namespace='/framework', broadcast=True)
 
             logger.info('{count} 항목을 추가하였습니다(갱신: {ucount}, 스킵: {scount}건)'.format(count=count, ucount=ucount, scount=scount))
             return
@@ -380,6 +541,7 @@ class LogicGSheet(object):
         except Exception as e:
             logger.error('Exception:%s', e)
             logger.error(traceback.format_exc())
+            GSpreadCache.invalidate(doc_url, e)
 
 
     @staticmethod
@@ -405,15 +567,7 @@ class LogicGSheet(object):
             if wsentity is None:
                 return {'ret':False, 'data':'유효한 아이템이 없습니다'}
 
-            entities = ListModelItem.get_entities_by_wsid(sheet_id)
-            for entity in entities:
-                entity.delete(entity.id)
-
-            wsentity.total_count = 0
-            wsentity.save()
-
-            logger.info('워크시트(%%s)에서 %d개의 아이템을 삭제하였습니다.', wsentity.doc_title, len(entities))
-            return {'ret':True, 'data':'%d개의 아이템을 삭제하였습니다.' % len(entities)}
+            return LogicGSheet.start_task('delete_items', LogicGSheet.task_delete_items, sheet_id)
         except Exception as e:
             logger.error('Exception %s', e)
             logger.error(traceback.format_exc())
@@ -443,31 +597,18 @@ class LogicGSheet(object):
             if entity is None:
                 return {'ret':False, 'data':'유효한 아이템이 없습니다'}
 
-            command = [ModelSetting.get('gclone_path'),
-                    '--config',
-                    ModelSetting.get('gclone_config_path'),
-                    'size',
-                    'gc:{%s}' % entity.folder_id]
-
-            data = SystemLogicCommand.execute_command_return(command)
-            if data.find('Failed') > 0:
-                logger.error('failed to get size! (%s)' % (''.join(data)))
-                return {'ret':False, 'data': ''.join(data)}
-
-            data = data.split('\n')
-            entity.obj_num = int(data[0].split(':')[1].strip())
-            entity.str_size = data[1].split(':')[1].split('(')[0].strip()
-            entity.byte_size = LogicGSheet.get_byte_size(entity.str_size)
+            ret = LogicGSheet.get_sizes([entity])
+            if entity.id not in ret:
+                logger.error('failed to get size! (%s)', entity.folder_id)
+                return {'ret':False, 'data':'사이즈 조회에 실패하였습니다.'}
+
+            entity.obj_num, entity.byte_size = ret[entity.id]
+            entity.str_size = LogicGSheet.get_str_size(entity.byte_size)
             entity.updated_time = datetime.now()
             logger.debug('getsize: folder_id:%s obj_num: %d, size: %s', entity.folder_id, entity.obj_num, entity.str_size)
             entity.save()
             info_str = '<br>파일수: {obj_num}<br>사이즈: {str_size}'.format(obj_num=entity.obj_num, str_size=entity.str_size)
-            def func():
-                ret = LogicGSheet.update_size(entity.id)
-
-            thread = threading.Thread(target=func, args=())
-            thread.setDaemon(True)
-            thread.start()            
+            LogicGSheet.update_size(entity.id)
 
             return {'ret':True, 'data':info_str}
         except Exception as e:
@@ -479,12 +620,9 @@ class LogicGSheet(object):
     def get_user_copy_dest(category):
         try:
             if ModelSetting.get_bool('use_user_setting'):
-                rule_list = ModelSetting.get_list('user_copy_dest_rules', '\n')
-                for rule in rule_list:
-                    orig, converted = rule.split('|')
-                    if orig.endswith('*'): orig = orig.replace('*','')
-                    #logger.debug('orig(%s), category(%s)', orig, category)
-                    if category.upper().startswith(orig.upper()): return converted
+                matcher = ModelSetting.get_parsed('user_copy_dest_rules', LogicGSheet.parse_copy_dest_rules)
+                converted = matcher.match(category.upper()) if matcher is not None else None
+                if converted is not None: return converted
 
             return category
                 
@@ -493,6 +631,20 @@ class LogicGSheet(object):
             logger.error(traceback.format_exc())
             return None
 
+    @staticmethod
+    def parse_copy_dest_rules(value):
+        # 분류명|매핑카테고리 -> 대문자 prefix 기준 PrefixMatcher
+        rules = []
+        for rule in ModelSetting.split_list(value, '\n'):
+            orig, converted = rule.split('|')
+            if orig.endswith('*'): orig = orig.replace('*','')
+            rules.append((orig.upper(), converted))
+        return PrefixMatcher(rules)
+
+    @staticmethod
+    def parse_keyword_rules(value):
+        return KeywordMatcher(ModelSetting.split_list(value, '|'))
+
     @staticmethod
     def get_byte_size(str_size):
         try:
@@ -560,36 +712,42 @@ class LogicGSheet(object):
             return '-'
 
     @staticmethod
-    def scheduled_copy(sheet_id):
+    def scheduled_copy(sheet_id, lease=True):
+        # lease: False 인 경우 호출측에서 이미 lease를 잡은 상태
+        if lease and not WSModelItem.acquire_lease(sheet_id):
+            return {'ret':False, 'data':'워크시트 작업이 실행중입니다.'}
         try:
-            wsentity = WSModelItem.get(sheet_id)
-            wsentity.is_running = True
-            wsentity.save()
+            lease_renewed = time.time()
 
             # COPY items
             succeed = 0
             failed = 0
 
             copy_mode = ModelSetting.get_int('copy_mode')
-            if copy_mode == 0: return
+            if copy_mode == 0:
+                ret = {'ret':True, 'data':'copy mode: Nothing'}
+                return ret
 
-            # keyword rule 적용: 미사용-너무느림
-            #rules = ModelSetting.get_list('keyword_rules', '|') if copy_mode == 1 else ModelSetting.get_list('except_keyword_rules', '|')
+            # keyword rule: 파일타입 아이템에 적용
+            matcher = ModelSetting.get_parsed('keyword_rules' if copy_mode == 1 else 'except_keyword_rules', LogicGSheet.parse_keyword_rules)
 
             # TODO:Plex 연동저건에 따른 처리: 0 연동안함, 1: 있으면 skip, 2: 용량크면복사
             #plex_condition = ModelSetting.get_int('plex_condition')
 
             for entity in ListModelItem.get_schedule_target_items(sheet_id):
+                if time.time() - lease_renewed > WSModelItem.lease_seconds / 2:
+                    WSModelItem.renew_lease(sheet_id)
+                    lease_renewed = time.time()
+
                 # keyword rule 적용: 파일타입의 경우만
                 if entity.mimetype == 1:
-                    rules = ModelSetting.get_list('keyword_rules', '|') if copy_mode == 1 else ModelSetting.get_list('except_keyword_rules', '|')
                     copy_flag = True
-                    for rule in rules:
-                        copy_flag = False if copy_mode == 1 else True
-                        if entity.title.find(rule) != -1:
-                            copy_flag = not copy_flag
+                    if matcher is not None and len(matcher) > 0:
+                        rule = matcher.search(entity.title)
+                        # copy_mode: 1-whitelist(일치시 복사), 2-blacklist(일치시 제외)
+                        copy_flag = (rule is not None) if copy_mode == 1 else (rule is None)
+                        if rule is not None:
                             logger.debug('keyword(%s) is matched, copy_flag(%s)', rule, copy_flag)
-                            break
                     if not copy_flag: continue
                     if entity.copy_count > 1: continue
 
@@ -639,46 +797,183 @@ class LogicGSheet(object):
             logger.error(traceback.format_exc())
             ret = {'ret':False, 'data':'Exception'}
         finally:
-            wsentity.is_running = False
-            wsentity.save()
+            if lease: WSModelItem.release_lease(sheet_id)
             return ret
 
+    @staticmethod
+    def get_sizes(entities, callback=None):
+        # 아이템 id -> (파일수, byte 사이즈), 실패한 항목은 제외
+        # 폴더는 Drive API로 하위를 탐색, 파일은 파일 정보의 사이즈
+        ret = {}
+        files = [x for x in entities if x.mimetype == 1]
+        folders = [x for x in entities if x.mimetype != 1]
+        if len(files) > 0:
+            finfos = LogicGSheet.get_files_info([x.folder_id for x in files])
+            for entity in files:
+                finfo = finfos.get(entity.folder_id)
+                if finfo is not None:
+                    ret[entity.id] = (1, int(finfo.get('size', 0)))
+        if len(folders) > 0:
+            sizes = DriveSizeCrawler(LogicGSheet.get_service()).get_sizes([x.folder_id for x in folders], callback=callback)
+            # 하위 항목이 없는 경우 파일일 수 있음(mimetype 컬럼 추가 이전 항목은 모두 0)
+            empty = [x for x in folders if sizes.get(x.folder_id) == (0, 0)]
+            finfos = LogicGSheet.get_files_info([x.folder_id for x in empty]) if len(empty) > 0 else {}
+            for entity in folders:
+                finfo = finfos.get(entity.folder_id)
+                if finfo is not None and finfo.get('mimeType') != DriveSizeCrawler.folder_mimetype:
+                    entity.mimetype = 1
+                    ret[entity.id] = (1, int(finfo.get('size', 0)))
+                elif sizes.get(entity.folder_id) is not None:
+                    ret[entity.id] = sizes[entity.folder_id]
+        return ret
+
+    @staticmethod
+    def get_sheet_size(sheet_id):
+        wsentity = WSModelItem.get(sheet_id)
+        if wsentity is None:
+            return {'ret':False, 'data':'유효한 아이템이 없습니다'}
+        return LogicGSheet.start_task('sheet_size', LogicGSheet.task_sheet_size, wsentity.id)
+
+    @staticmethod
+    def task_sheet_size(sheet_id):
+        # 시트의 모든 아이템 사이즈를 다시 계산, 바뀐 항목만 저장 후 시트에 기록
+        entities = db.session.query(ListModelItem).filter(ListModelItem.sheet_id == sheet_id, ListModelItem.excluded == 0).all()
+        def callback(done, total):
+            LogicGSheet.task_progress(done, total, 0)
+        sizes = LogicGSheet.get_sizes(entities, callback=callback)
+        updates = []
+        now = datetime.now()
+        for entity in entities:
+            if entity.id not in sizes:
+                continue
+            obj_num, byte_size = sizes[entity.id]
+            if obj_num == entity.obj_num and byte_size == entity.byte_size:
+                continue
+            updates.append({'id':entity.id, 'obj_num':obj_num, 'byte_size':byte_size, 'mimetype':entity.mimetype,
+                'str_size':LogicGSheet.get_str_size(byte_size), 'updated_time':now})
+            LogicGSheet.queue_writeback(sheet_id, entity.folder_id, {u'사이즈':updates[-1]['str_size'], u'파일수':obj_num})
+        ListModelItem.bulk_upsert([], updates)
+        LogicGSheet.task_status['count'] = len(updates)
+        return '{total}개 중 {count}개 아이템의 사이즈를 갱신하였습니다.(실패: {failed}건)'.format(total=len(entities), count=len(updates), failed=len(entities)-len(sizes))
+
     @staticmethod
     def update_size(entity_id):
+        # 시트에 사이즈/파일수 기록: write-back 큐에 추가
         try:
             entity = ListModelItem.get(entity_id)
-            wsentity = WSModelItem.get(entity.sheet_id)
+            if entity is None:
+                return
+            LogicGSheet.queue_writeback(entity.sheet_id, entity.folder_id, {u'사이즈':entity.str_size, u'파일수':entity.obj_num})
+        except Exception as e:
+            logger.error('Exception %s', e)
+            logger.error(traceback.format_exc())
 
-            doc_id = wsentity.doc_id
-            ws_id  = wsentity.ws_id
-            logger.debug('start to get item from gsheet: %s, ws:%d', doc_id, ws_id)
-            json_file = LogicGSheet.get_randon_json()
-            if json_file is None:
-                logger.error('failed to get json file. please check json file in (%s)', ModelSetting.get('path_accounts'))
-                return ret
-            doc_url = wsentity.doc_url
+    @staticmethod
+    def queue_writeback(sheet_id, folder_id, values):
+        # values: 시트 컬럼명 -> 값, 같은 항목은 마지막 값으로 덮어씀
+        with LogicGSheet.writeback_lock:
+            items = LogicGSheet.writeback_queue.setdefault(int(sheet_id), collections.OrderedDict())
+            items.setdefault(folder_id, {}).update(values)
+            if LogicGSheet.writeback_thread is None or not LogicGSheet.writeback_thread.is_alive():
+                LogicGSheet.writeback_thread = threading.Thread(target=LogicGSheet.writeback_thread_function, args=())
+                LogicGSheet.writeback_thread.setDaemon(True)
+                LogicGSheet.writeback_thread.start()
 
-            try:
-                import gspread
-            except ImportError:
-                os.system("{} install gspread".format(app.config['config']['pip']))
-                import gspread
+    @staticmethod
+    def writeback_thread_function():
+        # 주기적으로 워크시트별 values_batch_update 한번으로 기록, 큐가 비면 종료
+        while True:
+            time.sleep(ModelSetting.get_int('gsheet_writeback_interval') or 10)
+            with LogicGSheet.writeback_lock:
+                queue = LogicGSheet.writeback_queue
+                LogicGSheet.writeback_queue = {}
+                if len(queue) == 0:
+                    LogicGSheet.writeback_thread = None
+                    return
+            for sheet_id, items in queue.items():
+                if LogicGSheet.flush_writeback(sheet_id, items):
+                    LogicGSheet.writeback_attempts.pop(sheet_id, None)
+                    continue
+                attempts = LogicGSheet.writeback_attempts.get(sheet_id, 0) + 1
+                if attempts >= LogicGSheet.writeback_max_attempts:
+                    logger.error('writeback dropped: sheet_id(%d), %d items', sheet_id, len(items))
+                    LogicGSheet.writeback_attempts.pop(sheet_id, None)
+                    continue
+                LogicGSheet.writeback_attempts[sheet_id] = attempts
+                # 실패한 항목 다시 큐에, 그 사이 추가된 값이 우선
+                with LogicGSheet.writeback_lock:
+                    pending = LogicGSheet.writeback_queue.setdefault(sheet_id, collections.OrderedDict())
+                    for folder_id, values in items.items():
+                        merged = dict(values)
+                        merged.update(pending.get(folder_id, {}))
+                        pending[folder_id] = merged
 
-            gsp = gspread.authorize(LogicGSheet.credentials)
-            doc = gsp.open_by_url(doc_url)
-            ws = LogicGSheet.get_worksheet(doc, ws_id)
-            cols = ws.row_values(1)
+    @staticmethod
+    def get_writeback_cols(sheet_id, wsentity, ws, refresh=False):
+        # 헤더 -> 열번호: 시트 내용이 바뀌었거나 오래된 경우 다시 읽음
+        cached = LogicGSheet.writeback_cols.get(sheet_id)
+        if refresh or cached is None or cached['content_hash'] != wsentity.content_hash \
+                or time.time() - cached['time'] > LogicGSheet.writeback_cols_ttl:
+            header = ws.row_values(1)
+            cols = {name:idx+1 for idx, name in enumerate(header)}
+            cached = {'cols':cols, 'content_hash':wsentity.content_hash, 'time':time.time()}
+            LogicGSheet.writeback_cols[sheet_id] = cached
+        return cached['cols']
 
-            index_size = cols.index(u'사이즈')
-            index_obj_num = cols.index(u'파일수')
-            cell = ws.find(entity.folder_id)
+    @staticmethod
+    def get_writeback_rows(sheet_id, wsentity, ws):
+        # folder_id -> 행번호: 시트에서 직접 행을 추가/삭제/정렬할 수 있으므로 매번 폴더 ID 열을 다시 읽음
+        # 폴더 ID 열 위치가 바뀐 경우 헤더도 다시 읽음
+        cols = LogicGSheet.get_writeback_cols(sheet_id, wsentity, ws)
+        column = ws.col_values(cols[u'폴더 ID']) if u'폴더 ID' in cols else []
+        if len(column) == 0 or column[0] != u'폴더 ID':
+            cols = LogicGSheet.get_writeback_cols(sheet_id, wsentity, ws, refresh=True)
+            column = ws.col_values(cols[u'폴더 ID']) if u'폴더 ID' in cols else []
+        rows = {}
+        for idx, folder_id in enumerate(column[1:]):
+            if folder_id != u'' and folder_id not in rows:
+                rows[folder_id] = idx + 2
+        return rows, cols
 
-            ws.update_cell(cell.row, index_size+1, entity.str_size)
-            ws.update_cell(cell.row, index_obj_num+1, entity.obj_num)
+    @staticmethod
+    def flush_writeback(sheet_id, items):
+        wsentity = None
+        try:
+            wsentity = WSModelItem.get(sheet_id)
+            if wsentity is None:
+                return True
+
+            ws = LogicGSheet.get_worksheet(wsentity.doc_url, wsentity.ws_id)
+            if ws is None:
+                logger.error('writeback: worksheet not found: sheet_id(%d)', sheet_id)
+                return True
+            from gspread.utils import rowcol_to_a1
+
+            rows, cols = LogicGSheet.get_writeback_rows(sheet_id, wsentity, ws)
+
+            data = []
+            title = ws.title.replace(u"'", u"''")
+            for folder_id, values in items.items():
+                row = rows.get(folder_id)
+                if row is None:
+                    logger.warning('writeback: folder_id(%s) not found in sheet_id(%d)', folder_id, sheet_id)
+                    continue
+                for name, value in values.items():
+                    col = cols.get(name)
+                    if col is None:
+                        continue
+                    data.append({'range':u"'%s'!%s" % (title, rowcol_to_a1(row, col)), 'values':[[value]]})
 
+            if len(data) > 0:
+                ws.spreadsheet.values_batch_update(body={'valueInputOption':'USER_ENTERED', 'data':data})
+            logger.info('writeback: sheet_id(%d), %d items, %d cells', sheet_id, len(items), len(data))
+            return True
         except Exception as e:
             logger.error('Exception %s', e)
             logger.error(traceback.format_exc())
+            if wsentity is not None:
+                GSpreadCache.invalidate(wsentity.doc_url, e)
+            return False
 
     @staticmethod
     def gclone_copy(id):
@@ -702,12 +997,14 @@ class LogicGSheet(object):
                 dest_folder = entity.category + '/' + entity.title2 if entity.title2 != u'' else entity.title
                 gcstring = 'gc:{%s}|%s/%s' % (entity.folder_id, "gc:{}", dest_folder)
 
-            tmp = ModelSetting.get('gclone_queue_list')
-            if tmp.find(gcstring) != -1:
+            if LogicGclone.queue_exist(gcstring):
                 return {'ret':True, 'data':'이미 큐에 존재합니다.'}
             else:
                 LogicGclone.queue_append([gcstring])
                 entity.copied_time = datetime.now()
+                copy_column = ModelSetting.get('gsheet_copy_column')
+                if copy_column:
+                    LogicGSheet.queue_writeback(entity.sheet_id, entity.folder_id, {copy_column:entity.copied_time.strftime('%Y-%m-%d %H:%M:%S')})
 
             # 처음 복사하는 경우만 시트정보에 카운트 갱신
             if entity.copy_count == 0:
@@ -771,24 +1068,11 @@ class LogicGSheet(object):
                 db.session.commit()
                 data = '{c1}개의 아이템을 삭제하였습니다.'.format(c1=c1)
             elif reqtype  == "copied_item":
-                #c1 = db.session.query(ListModelItem).filter(ListModelItem.copy_count > 0).delete()
-                query = db.session.query(ListModelItem).filter(ListModelItem.copy_count > 0)
-                query = query.filter(ListModelItem.excluded == 0)
-                entities = query.all()
-                for e in entities:
-                    e.excluded = 1
-                    e.save()
-                #db.session.commit()
-                data = '{c1}개의 복사된 아이템을 삭제하였습니다.'.format(c1=len(entities))
+                return LogicGSheet.start_task(reqtype, LogicGSheet.task_copied_item)
             elif reqtype  == "no_item":
-                from sqlalchemy import and_
-                #c1 = db.session.query(ListModelItem).filter(and_(ListModelItem.obj_num == 0, ListModelItem.str_size == '0 Bytes')).delete()
-                entities = db.session.query(ListModelItem).filter(and_(ListModelItem.obj_num == 0, ListModelItem.str_size == '0 Bytes')).all()
-                for e in entities:
-                    e.excluded = 1
-                    e.save()
-                #db.session.commit()
-                data = '{c1}개의 불량 아이템을 삭제하였습니다.'.format(c1=len(entities))
+                return LogicGSheet.start_task(reqtype, LogicGSheet.task_no_item)
+            WSModelItem.count_cache.invalidate()
+            ListModelItem.count_cache.invalidate()
             ret = {'ret':True, 'data':data}
             return ret
         except Exception as e:
@@ -799,20 +1083,419 @@ class LogicGSheet(object):
 
     @staticmethod
     def size_migration():
+        return LogicGSheet.start_task('size_migration', LogicGSheet.task_size_migration)
+
+    @staticmethod
+    def start_task(task_type, func, *args):
+        # 일괄 작업을 background로 실행, 완료시 notify
+        if not LogicGSheet.task_lock.acquire(False):
+            return {'ret':False, 'data':'다른 일괄 작업이 실행중입니다.'}
+        LogicGSheet.task_status = {'status':'running', 'type':task_type, 'current':0, 'total':0, 'count':0}
+        def thread_function():
+            try:
+                data = {'type':'success', 'msg':func(*args)}
+            except Exception as e:
+                logger.error('Exception %s', e)
+                logger.error(traceback.format_exc())
+                data = {'type':'warning', 'msg':'일괄 작업이 실패하였습니다. 로그를 확인하세요'}
+            finally:
+                LogicGSheet.task_status['status'] = 'ready'
+                LogicGSheet.task_lock.release()
+            logger.info(data['msg'])
+            socketio.emit("notify", data, namespace='/framework', broadcast=True)
+
+        thread = threading.Thread(target=thread_function, args=())
+        thread.setDaemon(True)
+        thread.start()
+        return {'ret':True, 'data':'일괄 작업을 시작하였습니다. 완료시 알림이 표시됩니다.'}
+
+    @staticmethod
+    def task_progress(current, total, count):
+        LogicGSheet.task_status['current'] = current
+        LogicGSheet.task_status['total'] = total
+        LogicGSheet.task_status['count'] = count
+
+    @staticmethod
+    def task_copied_item():
+        query = db.session.query(ListModelItem).filter(ListModelItem.copy_count > 0, ListModelItem.excluded == 0)
+        count = ListModelItem.update_by_id_range(query, {'excluded':1}, callback=LogicGSheet.task_progress)
+        return '{c1}개의 복사된 아이템을 삭제하였습니다.'.format(c1=count)
+
+    @staticmethod
+    def task_no_item():
+        query = db.session.query(ListModelItem).filter(ListModelItem.obj_num == 0, ListModelItem.str_size == '0 Bytes', ListModelItem.excluded == 0)
+        count = ListModelItem.update_by_id_range(query, {'excluded':1}, callback=LogicGSheet.task_progress)
+        return '{c1}개의 불량 아이템을 삭제하였습니다.'.format(c1=count)
+
+    @staticmethod
+    def task_size_migration():
+        query = db.session.query(ListModelItem).filter(ListModelItem.byte_size == 0, ListModelItem.str_size != '-')
+        count = ListModelItem.update_by_id_range(query, {'byte_size':ListModelItem.get_byte_size_expression()}, callback=LogicGSheet.task_progress)
+        return '{count}개 아이템의 사이즈를 변환하였습니다.'.format(count=count)
+
+    @staticmethod
+    def task_delete_items(sheet_id):
+        query = db.session.query(ListModelItem).filter(ListModelItem.sheet_id == sheet_id)
+        count = ListModelItem.update_by_id_range(query, None, callback=LogicGSheet.task_progress)
+        wsentity = WSModelItem.get(sheet_id)
+        if wsentity is not None:
+            wsentity.total_count = 0
+            wsentity.save()
+            logger.info('워크시트(%s)에서 %d개의 아이템을 삭제하였습니다.', wsentity.doc_title, count)
+        return '%d개의 아이템을 삭제하였습니다.' % count
+
+
+class KeywordMatcher(object):
+    # Aho-Corasick: 여러 키워드를 제목 한번 순회로 검사
+    def __init__(self, keywords):
+        self.keywords = [x for x in keywords if x != u'']
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [None]    # 노드에서 끝나는(fail 경로 포함) 가장 앞 키워드 index
+        for idx, keyword in enumerate(self.keywords):
+            node = 0
+            for ch in keyword:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(None)
+                    self.goto[node][ch] = nxt
+                node = nxt
+            if self.output[node] is None:
+                self.output[node] = idx
+
+        queue = collections.deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f != 0 and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                out = self.output[self.fail[nxt]]
+                if out is not None and (self.output[nxt] is None or out < self.output[nxt]):
+                    self.output[nxt] = out
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def search(self, text):
+        # 처음 발견된 키워드, 없으면 None
+        node = 0
+        goto = self.goto
+        for ch in text:
+            while node != 0 and ch not in goto[node]:
+                node = self.fail[node]
+            node = goto[node].get(ch, 0)
+            if self.output[node] is not None:
+                return self.keywords[self.output[node]]
+        return None
+
+
+class PrefixMatcher(object):
+    # prefix trie: text의 prefix인 규칙 중 가장 앞 규칙의 값
+    def __init__(self, rules):
+        self.root = {}
+        self.values = []
+        for idx, (prefix, value) in enumerate(rules):
+            self.values.append(value)
+            node = self.root
+            for ch in prefix:
+                node = node.setdefault(ch, {})
+            if None not in node:
+                node[None] = idx
+
+    def match(self, text):
+        node = self.root
+        best = node.get(None)
+        for ch in text:
+            node = node.get(ch)
+            if node is None:
+                break
+            idx = node.get(None)
+            if idx is not None and (best is None or idx < best):
+                best = idx
+        return self.values[best] if best is not None else None
+
+
+class DriveSizeCrawler(object):
+    # files.list를 batch 요청으로 여러개씩 보내며 폴더를 BFS 탐색해 파일수/사이즈 계산
+    # 계산된 폴더(하위폴더 포함)는 memo_ttl 동안 재사용
+    folder_mimetype = 'application/vnd.google-apps.folder'
+    memo = {}
+    memo_lock = threading.Lock()
+    memo_ttl = 3600
+    memo_max_entries = 100000
+
+    def __init__(self, service, batch_size=100):
+        self.service = service
+        self.batch_size = batch_size
+
+    def get_memo(self, folder_id):
+        with DriveSizeCrawler.memo_lock:
+            value = DriveSizeCrawler.memo.get(folder_id)
+        if value is not None and time.time() - value[2] < DriveSizeCrawler.memo_ttl:
+            return (value[0], value[1])
+        return None
+
+    def get_sizes(self, folder_ids, callback=None):
+        # folder_id -> (파일수, byte 사이즈), 실패한 폴더는 None
+        # callback(처리한 폴더수, 발견한 폴더수)
+        known = {}      # memo에 있는 폴더
+        children = {}   # 폴더 -> 하위폴더 목록
+        direct = {}     # 폴더 -> [직속 파일수, 사이즈]
+        failed = set()
+        visited = set()
+        pending = collections.deque()
+        for folder_id in folder_ids:
+            if folder_id in visited:
+                continue
+            visited.add(folder_id)
+            memo = self.get_memo(folder_id)
+            if memo is not None: known[folder_id] = memo
+            else: pending.append((folder_id, None))
+
+        done = [0]
+        def make_callback(folder_id):
+            def batch_callback(request_id, response, exception):
+                if exception is not None:
+                    logger.error('Exception:%s', exception)
+                    failed.add(folder_id)
+                    return
+                stat = direct.setdefault(folder_id, [0, 0])
+                for f in response.get('files', []):
+                    if f['mimeType'] == DriveSizeCrawler.folder_mimetype:
+                        children.setdefault(folder_id, []).append(f['id'])
+                        if f['id'] in visited:
+                            continue
+                        visited.add(f['id'])
+                        memo = self.get_memo(f['id'])
+                        if memo is not None: known[f['id']] = memo
+                        else: pending.append((f['id'], None))
+                    else:
+                        stat[0] += 1
+                        stat[1] += int(f.get('size', 0))
+                if response.get('nextPageToken') is not None:
+                    pending.append((folder_id, response['nextPageToken']))
+                else:
+                    done[0] += 1
+            return batch_callback
+
+        while len(pending) > 0:
+            chunk = [pending.popleft() for i in range(min(self.batch_size, len(pending)))]
+            try:
+                batch = self.service.new_batch_http_request()
+                for folder_id, page_token in chunk:
+                    batch.add(self.service.files().list(q="'%s' in parents and trashed = false" % folder_id,
+                        fields='nextPageToken, files(id, mimeType, size)', pageSize=1000, pageToken=page_token,
+                        supportsAllDrives=True, includeItemsFromAllDrives=True), callback=make_callback(folder_id))
+                batch.execute()
+            except Exception as e:
+                logger.error('Exception:%s', e)
+                logger.error(traceback.format_exc())
+                for folder_id, page_token in chunk:
+                    failed.add(folder_id)
+            if callback is not None:
+                callback(done[0], len(visited))
+
+        # 하위폴더부터 합산
+        computed = dict(known)
+        for folder_id in folder_ids:
+            stack = [(folder_id, False)]
+            while len(stack) > 0:
+                current, expanded = stack.pop()
+                if current in computed:
+                    continue
+                if not expanded:
+                    stack.append((current, True))
+                    for child in children.get(current, []):
+                        if child not in computed: stack.append((child, False))
+                    continue
+                value = None
+                if current not in failed:
+                    value = direct.get(current, [0, 0])[:]
+                    for child in children.get(current, []):
+                        if computed.get(child) is None:
+                            value = None
+                            break
+                        value[0] += computed[child][0]
+                        value[1] += computed[child][1]
+                computed[current] = tuple(value) if value is not None else None
+
+        now = time.time()
+        with DriveSizeCrawler.memo_lock:
+            for folder_id, value in computed.items():
+                if value is not None and folder_id not in known:
+                    DriveSizeCrawler.memo[folder_id] = (value[0], value[1], now)
+            DriveSizeCrawler.evict(now)
+        return {x:computed.get(x) for x in folder_ids}
+
+    @staticmethod
+    def evict(now):
+        # 만료된 항목 삭제 후 최대 개수를 넘으면 오래된 순으로 삭제 (memo_lock 안에서 호출)
+        memo = DriveSizeCrawler.memo
+        for folder_id in [k for k, v in memo.items() if now - v[2] >= DriveSizeCrawler.memo_ttl]:
+            del memo[folder_id]
+        if len(memo) > DriveSizeCrawler.memo_max_entries:
+            for folder_id in sorted(memo, key=lambda k: memo[k][2])[:len(memo) - DriveSizeCrawler.memo_max_entries]:
+                del memo[folder_id]
+
+
+class GoogleClientFactory(object):
+    # discovery 문서는 디스크에 캐시, 계정별 credentials는 공유
+    # Drive client(httplib2)는 스레드에 안전하지 않으므로 스레드/계정별로 만들고 토큰 만료시 재생성
+    discovery_url = 'https://www.googleapis.com/discovery/v1/apis/{api}/{version}/rest'
+    discovery_ttl = 7 * 24 * 3600
+    discovery = {}
+    credentials = {}
+    lock = threading.Lock()
+    local = threading.local()
+
+    @staticmethod
+    def get_discovery_path(api, version):
+        return os.path.join(path_data, package_name, 'discovery_%s_%s.json' % (api, version))
+
+    @staticmethod
+    def get_discovery(api, version):
+        key = (api, version)
+        with GoogleClientFactory.lock:
+            if key in GoogleClientFactory.discovery:
+                return GoogleClientFactory.discovery[key]
+            path = GoogleClientFactory.get_discovery_path(api, version)
+            doc = None
+            try:
+                if os.path.exists(path) and time.time() - os.path.getmtime(path) < GoogleClientFactory.discovery_ttl:
+                    with open(path, 'r') as f:
+                        doc = f.read()
+                else:
+                    import requests
+                    res = requests.get(GoogleClientFactory.discovery_url.format(api=api, version=version), timeout=30)
+                    res.raise_for_status()
+                    doc = res.text
+                    with open(path, 'w') as f:
+                        f.write(doc)
+            except Exception as e:
+                logger.error('Exception:%s', e)
+                logger.error(traceback.format_exc())
+                # 갱신 실패시 기존 파일 사용
+                if os.path.exists(path):
+                    with open(path, 'r') as f:
+                        doc = f.read()
+            if doc is not None:
+                GoogleClientFactory.discovery[key] = doc
+            return doc
+
+    @staticmethod
+    def load_credentials(json_file, scope):
         try:
-            from sqlalchemy import and_
-            count = 0
-            entity_list = db.session.query(ListModelItem).filter(and_(ListModelItem.byte_size == 0, ListModelItem.str_size != '-')).all()
-            for e in entity_list:
-                e.byte_size = LogicGSheet.get_byte_size(e.str_size)
-                e.save()
-                #logger.debug('%s:%s -> %d', e.title, e.str_size, e.byte_size)
-                count += 1
+            from oauth2client.service_account import ServiceAccountCredentials
+        except ImportError:
+            os.system("{} install oauth2client".format(app.config['config']['pip']))
+            from oauth2client.service_account import ServiceAccountCredentials
+        return ServiceAccountCredentials.from_json_keyfile_name(json_file, scope)
 
-            data = '{count}개 아이템의 사이즈를 변환하였습니다.'.format(count=count)
-            ret = {'ret':True, 'data':data}
-            return ret
-        except Exception as e:
-            logger.error('Exception %s', e)
-            logger.error(traceback.format_exc())
-            return {'ret':False, 'data':''}
+    @staticmethod
+    def get_credentials(json_file, scope):
+        # gspread용 공유 credentials
+        key = (json_file, tuple(scope))
+        with GoogleClientFactory.lock:
+            credentials = GoogleClientFactory.credentials.get(key)
+            if credentials is None or credentials.invalid:
+                credentials = GoogleClientFactory.load_credentials(json_file, scope)
+                GoogleClientFactory.credentials[key] = credentials
+            return credentials
+
+    @staticmethod
+    def get_service(json_file, scope, api='drive', version='v3'):
+        clients = getattr(GoogleClientFactory.local, 'clients', None)
+        if clients is None:
+            clients = GoogleClientFactory.local.clients = {}
+        key = (json_file, api, version)
+        client = clients.get(key)
+        if client is not None and not client[1].access_token_expired:
+            return client[0]
+        try:
+            from googleapiclient.discovery import build, build_from_document
+        except ImportError:
+            os.system("{} install google-api-python-client".format(app.config['config']['pip']))
+            from googleapiclient.discovery import build, build_from_document
+        credentials = GoogleClientFactory.load_credentials(json_file, scope)
+        doc = GoogleClientFactory.get_discovery(api, version)
+        if doc is not None:
+            service = build_from_document(doc, credentials=credentials)
+        else:
+            service = build(api, version, credentials=credentials)
+        clients[key] = (service, credentials)
+        return service
+
+
+class GSpreadCache(object):
+    # 계정별 gspread client와 문서(doc_id) -> (spreadsheet, ws_id -> worksheet) 캐시
+    # ttl이 지나거나 인증 오류가 나면 다시 연다
+    ttl = 600
+    max_docs = 20
+    lock = threading.Lock()
+    clients = {}
+    docs = collections.OrderedDict()
+    doc_id_regex = re.compile(r'/spreadsheets/d/(?P<doc_id>[a-zA-Z0-9\-_]+)')
+
+    @staticmethod
+    def get_doc_id(doc_url):
+        match = GSpreadCache.doc_id_regex.search(doc_url)
+        return match.group('doc_id') if match else doc_url
+
+    @staticmethod
+    def get_client():
+        try:
+            import gspread
+        except ImportError:
+            os.system("{} install gspread".format(app.config['config']['pip']))
+            import gspread
+        json_file, credentials = LogicGSheet.get_account()
+        with GSpreadCache.lock:
+            value = GSpreadCache.clients.get(json_file)
+            if value is not None and time.time() - value[1] < GSpreadCache.ttl:
+                return value[0]
+        client = gspread.authorize(credentials)
+        with GSpreadCache.lock:
+            GSpreadCache.clients[json_file] = (client, time.time())
+        return client
+
+    @staticmethod
+    def open(doc_url, refresh=False):
+        # (spreadsheet, OrderedDict(ws_id -> worksheet))
+        doc_id = GSpreadCache.get_doc_id(doc_url)
+        now = time.time()
+        with GSpreadCache.lock:
+            value = GSpreadCache.docs.get(doc_id)
+            if value is not None and not refresh and now - value[2] < GSpreadCache.ttl:
+                del GSpreadCache.docs[doc_id]
+                GSpreadCache.docs[doc_id] = value
+                return value[0], value[1]
+        doc = GSpreadCache.get_client().open_by_url(doc_url)
+        worksheets = collections.OrderedDict((ws.id, ws) for ws in doc.worksheets())
+        with GSpreadCache.lock:
+            GSpreadCache.docs.pop(doc_id, None)
+            GSpreadCache.docs[doc_id] = (doc, worksheets, now)
+            while len(GSpreadCache.docs) > GSpreadCache.max_docs:
+                GSpreadCache.docs.popitem(last=False)
+        return doc, worksheets
+
+    @staticmethod
+    def is_auth_error(e):
+        status = getattr(getattr(e, 'response', None), 'status_code', None)
+        return status in [401, 403] or e.__class__.__name__ in ['HttpAccessTokenRefreshError', 'AccessTokenRefreshError']
+
+    @staticmethod
+    def invalidate(doc_url=None, e=None):
+        # 오류가 난 문서는 다시 열고, 인증 오류면 client도 다시 만듦
+        with GSpreadCache.lock:
+            if doc_url is not None:
+                GSpreadCache.docs.pop(GSpreadCache.get_doc_id(doc_url), None)
+            elif e is None:
+                GSpreadCache.docs.clear()
+            if (doc_url is None and e is None) or (e is not None and GSpreadCache.is_auth_error(e)):
+                GSpreadCache.clients.clear()
@@ -2,13 +2,16 @@
 #########################################################
 # python
 import traceback
+import hashlib
+import threading
+import time
 from datetime import datetime,timedelta
 import json
 import os
 import re
 
 # third-party
-from sqlalchemy import or_, and_, func, not_, desc
+from sqlalchemy import or_, and_, func, not_, desc, text, case, cast, Integer, Float
 from sqlalchemy.orm import backref
 
 
@@ -30,6 +33,14 @@ class ModelSetting(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     key = db.Column(db.String(100), unique=True, nullable=False)
     value = db.Column(db.String, nullable=False)
+
+    # 프로세스 설정 캐시: key -> 값, (key, 변환) -> 변환된 값
+    cache = {}
+    parsed_cache = {}
+    cache_lock = threading.Lock()
+    cache_stats = {'hit':0, 'miss':0}
+    # invalidate 횟수: DB 조회중 변경된 값은 캐시에 넣지 않음
+    generation = {None:0}
  
     def __init__(self, key, value):
         self.key = key
@@ -44,11 +55,58 @@ class ModelSetting(db.Model):
     @staticmethod
     def get(key):
         try:
-            return db.session.query(ModelSetting).filter_by(key=key).first().value.strip()
+            with ModelSetting.cache_lock:
+                value = ModelSetting.cache.get(key)
+                if value is not None:
+                    ModelSetting.cache_stats['hit'] += 1
+                    return value
+                ModelSetting.cache_stats['miss'] += 1
+                generation = (ModelSetting.generation[None], ModelSetting.generation.get(key, 0))
+            value = db.session.query(ModelSetting).filter_by(key=key).first().value.strip()
+            with ModelSetting.cache_lock:
+                if generation == (ModelSetting.generation[None], ModelSetting.generation.get(key, 0)):
+                    ModelSetting.cache[key] = value
+            return value
         except Exception as e:
             logger.error('Exception:%s %s', e, key)
             logger.error(traceback.format_exc())
             return None
+
+    @staticmethod
+    def get_parsed(key, func, *args):
+        # 설정값을 func(value, *args)로 변환한 결과를 설정값이 바뀔 때까지 재사용
+        try:
+            value = ModelSetting.get(key)
+            cached = ModelSetting.parsed_cache.get((key, func, args))
+            if cached is not None and cached[0] == value:
+                return cached[1]
+            parsed = func(value, *args)
+            with ModelSetting.cache_lock:
+                ModelSetting.parsed_cache[(key, func, args)] = (value, parsed)
+            return parsed
+        except Exception as e:
+            logger.error('Exception:%s %s', e, key)
+            logger.error(traceback.format_exc())
+            # 호출측에서 None 처리가 필요 없도록 빈 설정값으로 변환한 결과 반환
+            return func('', *args)
+
+    @staticmethod
+    def invalidate(key=None):
+        # key가 None이면 전체 삭제
+        with ModelSetting.cache_lock:
+            if key is None:
+                ModelSetting.generation[None] += 1
+                ModelSetting.cache.clear()
+                ModelSetting.parsed_cache.clear()
+            else:
+                ModelSetting.generation[key] = ModelSetting.generation.get(key, 0) + 1
+                ModelSetting.cache.pop(key, None)
+                for k in [k for k in ModelSetting.parsed_cache if k[0] == key]:
+                    ModelSetting.parsed_cache.pop(k, None)
+
+    @staticmethod
+    def get_cache_stats():
+        return dict(ModelSetting.cache_stats, count=len(ModelSetting.cache))
             
     
     @staticmethod
@@ -76,6 +134,7 @@ class ModelSetting(db.Model):
                 db.session.commit()
             else:
                 db.session.add(ModelSetting(key, value.strip()))
+            ModelSetting.invalidate(key)
         except Exception as e:
             logger.error('Exception:%s %s', e, key)
             logger.error(traceback.format_exc())
@@ -103,6 +162,7 @@ class ModelSetting(db.Model):
                 entity = db.session.query(ModelSetting).filter_by(key=key).with_for_update().first()
                 entity.value = value
             db.session.commit()
+            ModelSetting.invalidate()
             return True                  
         except Exception as e: 
             logger.error('Exception:%s', e)
@@ -114,18 +174,124 @@ class ModelSetting(db.Model):
     def get_list(key, delimeter):
         try:
             value = ModelSetting.get(key)
-            values = [x.strip() for x in value.split(delimeter)]
-            values = Util.get_list_except_empty(values)
-            return values
+            values = ModelSetting.get_parsed(key, ModelSetting.split_list, delimeter)
+            return list(values)
         except Exception as e: 
             logger.error('Exception:%s', e)
             logger.error(traceback.format_exc())
             logger.error('Error Key:%s Value:%s', key, value)
 
+    @staticmethod
+    def split_list(value, delimeter):
+        values = [x.strip() for x in value.split(delimeter)]
+        return tuple(Util.get_list_except_empty(values))
+
+
+class CountCache(object):
+    # 목록 전체건수 캐시: 조건 -> 건수, 데이터 변경시 invalidate, ttl초 후 만료
+    def __init__(self, ttl=300, max_entries=100):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, func):
+        with self.lock:
+            cached = self.data.get(key)
+        if cached is not None and time.time() - cached[1] < self.ttl:
+            return cached[0]
+        count = func()
+        with self.lock:
+            if len(self.data) >= self.max_entries:
+                self.data.clear()
+            self.data[key] = (count, time.time())
+        return count
+
+    def invalidate(self):
+        with self.lock:
+            self.data.clear()
+
+
+class QueryPager(object):
+    # keyset(cursor) 페이징: 인접 페이지 이동은 이전 응답의 첫/마지막 행 기준으로 조회
+    # 그 외(페이지 번호로 이동, 조건 변경)는 OFFSET
+    # keys: [(column, is_desc)], 마지막 column은 unique(id)
+
+    @staticmethod
+    def get_page(query, keys, page, page_size, cursor, signature):
+        try:
+            cursor = json.loads(cursor) if cursor else None
+        except ValueError:
+            cursor = None
+
+        lists = None
+        if cursor is not None and cursor.get('signature') == signature and cursor.get('page') in [page-1, page+1]:
+            forward = (cursor['page'] == page-1)
+            values = cursor.get('last' if forward else 'first')
+            if values is not None and len(values) == len(keys) and values[-1] is not None:
+                values = [QueryPager.load_value(column, value) for (column, is_desc), value in zip(keys, values)]
+                condition = QueryPager.get_condition(keys, values, forward)
+                if forward:
+                    lists = query.filter(condition).limit(page_size).all()
+                else:
+                    query = query.order_by(None).filter(condition)
+                    for column, is_desc in keys:
+                        query = query.order_by(column if is_desc else desc(column))
+                    lists = list(reversed(query.limit(page_size).all()))
+        if lists is None:
+            lists = query.limit(page_size).offset((page-1)*page_size).all()
+
+        ret = {'page':page, 'signature':signature, 'first':None, 'last':None}
+        if len(lists) > 0:
+            ret['first'] = [QueryPager.dump_value(getattr(lists[0], column.key)) for column, is_desc in keys]
+            ret['last'] = [QueryPager.dump_value(getattr(lists[-1], column.key)) for column, is_desc in keys]
+        return lists, ret
+
+    @staticmethod
+    def get_condition(keys, values, forward):
+        # (k1, k2, ..) 순서상 values 다음(forward) 또는 이전 행 조건
+        # sqlite는 NULL을 가장 작은 값으로 정렬: 오름차순이면 맨 앞, 내림차순이면 맨 뒤
+        conditions = []
+        for i, (column, is_desc) in enumerate(keys):
+            after = QueryPager.get_after(column, values[i], is_desc == forward)
+            if after is None:
+                continue
+            conditions.append(and_(*([QueryPager.get_equal(keys[j][0], values[j]) for j in range(i)] + [after])))
+        return or_(*conditions)
+
+    @staticmethod
+    def get_equal(column, value):
+        return column.is_(None) if value is None else (column == value)
+
+    @staticmethod
+    def get_after(column, value, descending):
+        # 진행 방향으로 value 다음 값 조건, 없으면 None
+        if value is None:
+            return None if descending else column.isnot(None)
+        if descending:
+            return or_(column < value, column.is_(None))
+        return column > value
+
+    @staticmethod
+    def dump_value(value):
+        if isinstance(value, datetime):
+            return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+        return value
+
+    @staticmethod
+    def load_value(column, value):
+        if value is not None and isinstance(column.type, db.DateTime):
+            return datetime.strptime(value, '%Y-%m-%d %H:%M:%S.%f')
+        return value
+
 
 class WSModelItem(db.Model):
     __tablename__ = '%s_wsitem' % package_name
-    __table_args__ = {'mysql_collate': 'utf8_general_ci'}
+    __table_args__ = (
+        db.Index('ix_%s_wsitem_in_schedule' % package_name, 'in_schedule'),
+        db.Index('ix_%s_wsitem_doc_ws' % package_name, 'doc_id', 'ws_id'),
+        {'mysql_collate': 'utf8_general_ci'}
+    )
     __bind_key__ = package_name
 
     id = db.Column(db.Integer, primary_key=True)
@@ -142,6 +308,13 @@ class WSModelItem(db.Model):
     copy_count = db.Column(db.Integer)
     total_count = db.Column(db.Integer)
     is_running = db.Column(db.Boolean)
+    doc_version = db.Column(db.String)   # Drive 문서 version
+    content_hash = db.Column(db.String)  # 워크시트 행 fingerprint 전체의 hash
+    lease_time = db.Column(db.DateTime)  # 실행 lease 만료시각
+
+    # 실행 lease 유지시간(초), 실행중에는 renew_lease로 연장
+    lease_seconds = 3600
+    count_cache = CountCache()
 
     def __init__(self, info):
         self.created_time = datetime.now()
@@ -169,6 +342,7 @@ class WSModelItem(db.Model):
         try:
             db.session.add(self)
             db.session.commit()
+            WSModelItem.count_cache.invalidate()
         except Exception as e:
             logger.error('Exception:%s', e)
             logger.error(traceback.format_exc())
@@ -249,9 +423,10 @@ class WSModelItem(db.Model):
             order = req.form['order'] if 'order' in req.form else 'desc'
 
             query = WSModelItem.make_query(search=search, order=order)
-            count = query.count()
-            query = query.limit(page_size).offset((page-1)*page_size)
-            lists = query.all()
+            count = WSModelItem.count_cache.get(search, query.order_by(None).count)
+            keys = [(WSModelItem.id, order == 'desc')]
+            signature = u'%s|%s' % (search, order)
+            lists, ret['cursor'] = QueryPager.get_page(query, keys, page, page_size, req.form.get('cursor'), signature)
             ret['list'] = [item.as_dict() for item in lists]
             ret['paging'] = Util.get_paging_info(count, page, page_size)
             return ret
@@ -301,8 +476,50 @@ class WSModelItem(db.Model):
             #logger.debug( "delete")
             db.session.query(WSModelItem).filter_by(id=id).delete()
             db.session.commit()
+            WSModelItem.count_cache.invalidate()
+
+        except Exception as e:
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+
+    @staticmethod
+    def acquire_lease(id):
+        # 실행중이 아니거나 lease가 만료된 경우에만 UPDATE 한번으로 획득
+        try:
+            now = datetime.now()
+            count = db.session.query(WSModelItem).filter(WSModelItem.id == id).filter(or_(
+                WSModelItem.is_running == False, WSModelItem.is_running == None,
+                WSModelItem.lease_time == None, WSModelItem.lease_time < now)).update(
+                {'is_running':True, 'lease_time':now + timedelta(seconds=WSModelItem.lease_seconds)},
+                synchronize_session=False)
+            db.session.commit()
+            return count == 1
+        except Exception as e:
+            db.session.rollback()
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+            return False
+
+    @staticmethod
+    def renew_lease(id):
+        try:
+            db.session.query(WSModelItem).filter_by(id=id, is_running=True).update(
+                {'lease_time':datetime.now() + timedelta(seconds=WSModelItem.lease_seconds)},
+                synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
 
+    @staticmethod
+    def release_lease(id):
+        try:
+            db.session.query(WSModelItem).filter_by(id=id).update(
+                {'is_running':False, 'lease_time':None}, synchronize_session=False)
+            db.session.commit()
         except Exception as e:
+            db.session.rollback()
             logger.error('Exception:%s', e)
             logger.error(traceback.format_exc())
 
@@ -311,6 +528,7 @@ class WSModelItem(db.Model):
         try:
             for e in db.session.query(WSModelItem).filter(WSModelItem.is_running == True).all():
                 e.is_running = False
+                e.lease_time = None
             db.session.commit()
 
         except Exception as e:
@@ -319,14 +537,22 @@ class WSModelItem(db.Model):
 
 class ListModelItem(db.Model):
     __tablename__ = '%s_listitem' % package_name
-    __table_args__ = {'mysql_collate': 'utf8_general_ci'}
+    __table_args__ = (
+        db.Index('ix_%s_listitem_sheet_category' % package_name, 'sheet_id', 'category'),
+        db.Index('ix_%s_listitem_folder_id' % package_name, 'folder_id'),
+        db.Index('ix_%s_listitem_category' % package_name, 'category'),
+        db.Index('ix_%s_listitem_excluded' % package_name, 'excluded', 'copy_count'),
+        db.Index('ix_%s_listitem_copy_count' % package_name, 'copy_count'),
+        db.Index('ix_%s_listitem_updated_time' % package_name, 'updated_time'),
+        {'mysql_collate': 'utf8_general_ci'}
+    )
     __bind_key__ = package_name
 
     id = db.Column(db.Integer, primary_key=True)
     json = db.Column(db.JSON)
     created_time = db.Column(db.DateTime)
 
-    sheet_id = db.Column(db.String)  #WSModelItem.ID
+    sheet_id = db.Column(db.Integer)  #WSModelItem.ID
     title = db.Column(db.String)
     title2 = db.Column(db.String)
     folder_id = db.Column(db.String)
@@ -338,6 +564,7 @@ class ListModelItem(db.Model):
     byte_size = db.Column(db.Integer)
     excluded = db.Column(db.Integer)
     mimetype = db.Column(db.Integer)    # 0: folder, 1: file
+    fingerprint = db.Column(db.String)  # 시트 행 hash
 
     updated_time = db.Column(db.DateTime)
 
@@ -356,6 +583,7 @@ class ListModelItem(db.Model):
         self.updated_time = datetime.now()
         self.excluded = 0
         self.mimetype = info['mimetype']
+        self.fingerprint = info['fingerprint']
 
     def __repr__(self):
         return repr(self.as_dict())
@@ -372,6 +600,7 @@ class ListModelItem(db.Model):
         try:
             db.session.add(self)
             db.session.commit()
+            ListModelItem.count_cache.invalidate()
         except Exception as e:
             logger.error('Exception:%s', e)
             logger.error(traceback.format_exc())
@@ -450,6 +679,142 @@ class ListModelItem(db.Model):
             return False
 
 
+    # 시트 갱신시 비교하는 컬럼
+    compare_columns = ['title', 'title2', 'category', 'obj_num', 'str_size', 'byte_size', 'fingerprint']
+    # fingerprint 계산에 사용하는 시트 컬럼
+    fingerprint_keys = [u'제목', u'폴더 ID', u'분류', u'제목 매핑', u'사이즈', u'파일수']
+    # sqlite 변수 개수 제한
+    chunk_size = 500
+    count_cache = CountCache()
+    # 제목/분류/폴더ID 검색 index: migration에서 생성, 없으면 LIKE 검색
+    fts_table_name = '%s_listitem_fts' % package_name
+    fts_enabled = None
+
+    @staticmethod
+    def get_folder_map(folder_ids):
+        # folder_id -> 비교용 컬럼 dict
+        try:
+            ret = {}
+            columns = [ListModelItem.id, ListModelItem.folder_id] + [getattr(ListModelItem, x) for x in ListModelItem.compare_columns]
+            keys = ['id', 'folder_id'] + ListModelItem.compare_columns
+            folder_ids = list(set(folder_ids))
+            for i in range(0, len(folder_ids), ListModelItem.chunk_size):
+                chunk = folder_ids[i:i+ListModelItem.chunk_size]
+                for row in db.session.query(*columns).filter(ListModelItem.folder_id.in_(chunk)):
+                    ret[row[1]] = dict(zip(keys, row))
+            return ret
+        except Exception as e:
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+            return None
+
+    @staticmethod
+    def get_changed_info(row, info):
+        # 변경된 컬럼만 update mapping으로 반환, 변경 없으면 None
+        ret = {}
+        for key in ListModelItem.compare_columns:
+            if row[key] != info[key]:
+                ret[key] = info[key]
+        if not ret:
+            return None
+        ret['id'] = row['id']
+        ret['updated_time'] = datetime.now()
+        return ret
+
+    @staticmethod
+    def get_insert_mapping(info):
+        now = datetime.now()
+        return {'created_time':now,
+                'sheet_id':info['sheet_id'],
+                'title':info['title'],
+                'title2':info['title2'],
+                'folder_id':info['folder_id'],
+                'category':info['category'],
+                'copied_time':None,
+                'copy_count':0,
+                'obj_num':info['obj_num'],
+                'str_size':info['str_size'],
+                'byte_size':info['byte_size'],
+                'updated_time':now,
+                'excluded':0,
+                'mimetype':info['mimetype'],
+                'fingerprint':info['fingerprint']}
+
+    @staticmethod
+    def update_by_id_range(query, values=None, step=10000, callback=None):
+        # query 대상을 id 구간별 UPDATE(values가 None이면 DELETE)
+        # callback(처리한 id 범위, 전체 id 범위, 처리건수)
+        count = 0
+        min_id, max_id = query.with_entities(func.min(ListModelItem.id), func.max(ListModelItem.id)).first()
+        if min_id is None:
+            return 0
+        for start in range(min_id, max_id + 1, step):
+            chunk = query.filter(ListModelItem.id >= start, ListModelItem.id < start + step)
+            if values is None:
+                count += chunk.delete(synchronize_session=False)
+            else:
+                count += chunk.update(values, synchronize_session=False)
+            db.session.commit()
+            if callback is not None:
+                callback(min(start + step, max_id + 1) - min_id, max_id - min_id + 1, count)
+        ListModelItem.count_cache.invalidate()
+        return count
+
+    @staticmethod
+    def get_byte_size_expression(column=None):
+        # LogicGSheet.get_byte_size의 SQL 버전: '1,234' -> 1234, '1.5 GBytes' -> 1500000000
+        # 해석할 수 없는 값('1.5', '12abc', '1  GBytes' 등)은 get_byte_size와 같이 0
+        if column is None: column = ListModelItem.str_size
+        str_size = func.replace(column, ',', '')
+        glob = lambda expr, pattern: expr.op('GLOB')(pattern)
+
+        # Bytes 단위가 없으면 int(): 앞뒤 공백, 부호 허용
+        digits = func.trim(str_size)
+        digits = case((glob(digits, u'[-+]*'), func.substr(digits, 2)), else_=digits)
+        is_integer = and_(digits != u'', not_(glob(digits, u'*[^0-9]*')))
+
+        # Bytes 단위가 있으면 '<숫자> <단위>' (공백 하나)
+        pos = func.instr(str_size, u' ')
+        num = func.substr(str_size, 1, pos - 1)
+        unit = func.substr(str_size, pos + 1)
+        mantissa = case((glob(num, u'[-+]*'), func.substr(num, 2)), else_=num)
+        is_number = and_(pos > 1,
+                         mantissa != u'', mantissa != u'.',
+                         not_(glob(mantissa, u'*[^0-9.]*')),
+                         not_(glob(mantissa, u'*.*.*')))
+        measer = case((unit == u'Bytes', 1.0),
+                      (unit.in_([u'KBytes', u'kBytes']), 1000.0),
+                      (unit == u'MBytes', 1000.0**2),
+                      (unit == u'GBytes', 1000.0**3),
+                      (unit == u'TBytes', 1000.0**4), else_=None)
+
+        value = case((and_(func.instr(str_size, u'Bytes') == 0, is_integer), cast(str_size, Integer)),
+                     (and_(func.instr(str_size, u'Bytes') > 0, is_number), cast(cast(num, Float) * measer, Integer)),
+                     else_=None)
+        return func.coalesce(value, 0)
+
+    @staticmethod
+    def get_fingerprint(record):
+        values = [u'%s' % record.get(key, u'') for key in ListModelItem.fingerprint_keys]
+        return hashlib.md5(u'\t'.join(values).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def bulk_upsert(inserts, updates):
+        try:
+            for i in range(0, len(inserts), ListModelItem.chunk_size):
+                db.session.bulk_insert_mappings(ListModelItem, inserts[i:i+ListModelItem.chunk_size])
+                db.session.commit()
+            for i in range(0, len(updates), ListModelItem.chunk_size):
+                db.session.bulk_update_mappings(ListModelItem, updates[i:i+ListModelItem.chunk_size])
+                db.session.commit()
+            ListModelItem.count_cache.invalidate()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+            return False
+
     @staticmethod
     def get_entity_by_folder_id(folder_id):
         try:
@@ -472,13 +837,28 @@ class ListModelItem(db.Model):
             logger.error(traceback.format_exc())
             return None
 
+    @staticmethod
+    def get_category_condition(categories):
+        # 분류명 일치 조건, 분류/* 는 하위분류 전체
+        conditions = []
+        names = []
+        for category in categories:
+            if category.endswith(u'/*'):
+                conditions.append(ListModelItem.category.like(category.replace(u'/*', u'/%')))
+            else:
+                names.append(category)
+        if len(names) > 0:
+            conditions.append(ListModelItem.category.in_(names))
+        return or_(*conditions)
+
     @staticmethod
     def get_schedule_target_items(sheet_id):
+        # 복사대상 아이템 generator
         try:
             copy_mode = ModelSetting.get_int('copy_mode')
             if copy_mode == 0:
                 logger.info('Not Copy! copy_mode is None')
-                return []
+                return iter([])
             query = db.session.query(ListModelItem).filter_by(sheet_id=sheet_id)
             # 섹제된 항목 제외
             query = query.filter(ListModelItem.excluded == 0)
@@ -494,34 +874,43 @@ class ListModelItem(db.Model):
                     query = query.filter(ListModelItem.updated_time < target_time)
 
             # 분류 룰 적용: whitelist/blaclist 분류/* 지원
+            # whitelist: 포함분류 AND NOT 제외분류
+            # blacklist: NOT 제외분류 OR 포함분류(제외분류라도 포함분류에 있으면 대상)
             categories = ModelSetting.get_list('category_rules', '\n')
             xcategories = ModelSetting.get_list('except_category_rules', '\n')
-            bxlist = []
-            if len(categories) > 0:
-                conditions = []
-                for category in categories:
-                    if category.endswith(u'/*'): category = category.replace(u'/*', u'/%')
-                    conditions.append(ListModelItem.category.like(category))
-                logger.debug(conditions)
-                if copy_mode == 1:  # whitelist mode
-                    query = query.filter(or_(*conditions))
-                else:               # for blacklist mode
-                    tmpquery = query
-                    tmpquery = tmpquery.filter(or_(*conditions))
-                    bxlist = tmpquery.all()
-
-            if len(xcategories) > 0:
-                query = query.filter(not_(ListModelItem.category.in_(xcategories)))
-
-            logger.debug('333:%d' % query.count())
-
-            ret = query.all() + bxlist
-            logger.info('get_schedule_target_items: count(%d)', len(ret))
-            return ret
+            include = ListModelItem.get_category_condition(categories) if len(categories) > 0 else None
+            exclude = not_(ListModelItem.get_category_condition(xcategories)) if len(xcategories) > 0 else None
+            if copy_mode == 1:  # whitelist mode
+                if include is not None: query = query.filter(include)
+                if exclude is not None: query = query.filter(exclude)
+            else:               # for blacklist mode
+                if exclude is not None:
+                    query = query.filter(or_(exclude, include) if include is not None else exclude)
+
+            return ListModelItem.iter_by_id(query)
         except Exception as e:
             logger.error('Exception:%s', e)
             logger.error(traceback.format_exc())
-            return []
+            return iter([])
+
+    @staticmethod
+    def iter_by_id(query):
+        # id 순서로 chunk_size개씩 나누어 조회(keyset)
+        count = 0
+        last_id = 0
+        try:
+            while True:
+                chunk = query.filter(ListModelItem.id > last_id).order_by(ListModelItem.id).limit(ListModelItem.chunk_size).all()
+                if len(chunk) == 0:
+                    break
+                last_id = chunk[-1].id
+                for entity in chunk:
+                    count += 1
+                    yield entity
+        except Exception as e:
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+        logger.info('get_schedule_target_items: count(%d)', count)
 
     @staticmethod
     def item_list(req):
@@ -542,10 +931,10 @@ class ListModelItem(db.Model):
             query = ListModelItem.make_query(sheet_id=sheet_id, search=search, option=option, copied=copied, order=order)
             if query is None: return ret
 
-            count = query.count()
+            count = ListModelItem.count_cache.get((sheet_id, search, option, copied), query.order_by(None).count)
             logger.debug(count)
-            query = query.limit(page_size).offset((page-1)*page_size)
-            lists = query.all()
+            signature = u'%s|%s|%s|%s|%s' % (sheet_id, search, option, copied, order)
+            lists, ret['cursor'] = QueryPager.get_page(query, ListModelItem.get_order_keys(order), page, page_size, req.form.get('cursor'), signature)
             #logger.debug(lists)
             ret['list'] = [item.as_dict() for item in lists]
             ret['paging'] = Util.get_paging_info(count, page, page_size)
@@ -572,31 +961,63 @@ class ListModelItem(db.Model):
         else: query = query.filter(ListModelItem.excluded == 0)
 	
         if search != '':
-            if option == 'folder_id':
-                query = query.filter(ListModelItem.folder_id.like('%'+search+'%'))
-                return query
-            elif option == 'category':
-                query = query.filter(ListModelItem.category.like('%'+search+'%'))
-            else: # title
-                conditions = []
-                conditions.append(ListModelItem.title.like('%'+search+'%'))
-                conditions.append(ListModelItem.title2.like('%'+search+'%'))
-                query = query.filter(or_(*conditions))
+            # 여러 단어는 | 또는 , 로 구분(OR)
+            if search.find('|') != -1: terms = search.split('|')
+            elif search.find(',') != -1: terms = search.split(',')
+            else: terms = [search]
+            terms = [x.strip() for x in terms if x.strip() != '']
+            if option == 'folder_id': columns = ['folder_id']
+            elif option == 'category': columns = ['category']
+            else: columns = ['title', 'title2']
+            query = ListModelItem.filter_search(query, columns, terms)
+
+        for column, is_desc in ListModelItem.get_order_keys(order):
+            query = query.order_by(desc(column) if is_desc else column)
+
+        return query
+
+    @staticmethod
+    def filter_search(query, columns, terms):
+        if len(terms) == 0:
+            return query
+        # trigram은 3글자 미만 검색이 안되므로 LIKE 사용
+        if ListModelItem.is_fts_enabled() and min([len(x) for x in terms]) >= 3:
+            match = u'{%s} : (%s)' % (u' '.join(columns), u' OR '.join([u'"%s"' % x.replace(u'"', u'""') for x in terms]))
+            return query.filter(text('{table_name}.id IN (SELECT rowid FROM {fts_table_name} WHERE {fts_table_name} MATCH :fts_match)'.format(
+                table_name=ListModelItem.__tablename__, fts_table_name=ListModelItem.fts_table_name))).params(fts_match=match)
+        conditions = []
+        for term in terms:
+            for column in columns:
+                conditions.append(getattr(ListModelItem, column).like('%'+term+'%'))
+        return query.filter(or_(*conditions))
 
+    @staticmethod
+    def is_fts_enabled():
+        # 검색 index(FTS5 trigram) 사용 가능 여부, 처음 한번만 확인
+        if ListModelItem.fts_enabled is None:
+            try:
+                ListModelItem.fts_enabled = db.session.execute(text("SELECT count(*) FROM sqlite_master WHERE type='table' AND name=:name"),
+                        {'name':ListModelItem.fts_table_name}, mapper=ListModelItem).scalar() > 0
+            except Exception as e:
+                logger.error('Exception:%s', e)
+                logger.error(traceback.format_exc())
+                ListModelItem.fts_enabled = False
+        return ListModelItem.fts_enabled
+
+    @staticmethod
+    def get_order_keys(order):
+        # 정렬 컬럼 목록, 같은 값은 id로 구분
         if order == 'desc':
-            query = query.order_by(desc(ListModelItem.id))
+            return [(ListModelItem.id, True)]
         elif order == 'up_desc':
-            query = query.order_by(desc(ListModelItem.updated_time))
+            return [(ListModelItem.updated_time, True), (ListModelItem.id, True)]
         elif order == 'up_asc':
-            query = query.order_by(ListModelItem.updated_time)
+            return [(ListModelItem.updated_time, False), (ListModelItem.id, False)]
         elif order == 'size_desc':
-            query = query.order_by(desc(ListModelItem.byte_size))
+            return [(ListModelItem.byte_size, True), (ListModelItem.id, True)]
         elif order == 'size_asc':
-            query = query.order_by(ListModelItem.byte_size)
-        else:
-            query = query.order_by(ListModelItem.id)
-
-        return query
+            return [(ListModelItem.byte_size, False), (ListModelItem.id, False)]
+        return [(ListModelItem.id, False)]
 
     @staticmethod
     def get(id):
@@ -614,6 +1035,7 @@ class ListModelItem(db.Model):
             #logger.debug( "delete")
             db.session.query(ListModelItem).filter_by(id=id).delete()
             db.session.commit()
+            ListModelItem.count_cache.invalidate()
 
         except Exception as e:
             logger.error('Exception:%s', e)
@@ -640,3 +1062,352 @@ class ListModelItem(db.Model):
             return 0
 
 
+
+
+class ModelGcloneJob(db.Model):
+    __tablename__ = '%s_gclone_job' % package_name
+    __table_args__ = (
+        db.UniqueConstraint('source', 'target', name='uq_%s_gclone_job_path' % package_name),
+        db.Index('ix_%s_gclone_job_state' % package_name, 'state', 'priority', 'id'),
+        {'mysql_collate': 'utf8_general_ci'}
+    )
+    __bind_key__ = package_name
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_time = db.Column(db.DateTime)
+    updated_time = db.Column(db.DateTime)
+    completed_time = db.Column(db.DateTime)
+
+    source = db.Column(db.String, nullable=False)
+    target = db.Column(db.String, nullable=False)
+    comment = db.Column(db.String)
+    state = db.Column(db.String)    # wait, running, completed, failed
+    priority = db.Column(db.Integer)
+    attempts = db.Column(db.Integer)
+
+    def __init__(self, source, target, comment=u'', priority=0):
+        self.created_time = datetime.now()
+        self.updated_time = self.created_time
+        self.completed_time = None
+        self.source = source
+        self.target = target
+        self.comment = comment
+        self.state = 'wait'
+        self.priority = priority
+        self.attempts = 0
+
+    def __repr__(self):
+        return repr(self.as_dict())
+
+    def as_dict(self):
+        ret = {x.name: getattr(self, x.name) for x in self.__table__.columns}
+        ret['created_time'] = self.created_time.strftime('%Y-%m-%d %H:%M:%S') 
+        ret['updated_time'] = self.updated_time.strftime('%Y-%m-%d %H:%M:%S') if self.updated_time is not None else None
+        ret['completed_time'] = self.completed_time.strftime('%Y-%m-%d %H:%M:%S') if self.completed_time is not None else None
+        return ret
+
+    def to_line(self):
+        line = u'%s|%s' % (self.source, self.target)
+        if self.comment is not None and self.comment != u'':
+            line += u' #%s' % self.comment
+        return line
+
+    @staticmethod
+    def parse_line(line):
+        # 형식 : 소스|타켓 #주석
+        try:
+            tmp = line.split('#', 1)
+            comment = tmp[1].strip() if len(tmp) > 1 else u''
+            tmp = tmp[0].split('|')
+            if len(tmp) != 2 or tmp[0].strip() == '' or tmp[1].strip() == '':
+                return None
+            return tmp[0].strip(), tmp[1].strip(), comment
+        except Exception as e:
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+            return None
+
+    @staticmethod
+    def get_by_path(source, target):
+        try:
+            return db.session.query(ModelGcloneJob).filter_by(source=source, target=target).first()
+        except Exception as e:
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+            return None
+
+    @staticmethod
+    def is_pending(source, target):
+        entity = ModelGcloneJob.get_by_path(source, target)
+        return entity is not None and entity.state != 'completed'
+
+    @staticmethod
+    def enqueue(source, target, comment=u'', priority=0):
+        # 신규 또는 완료된 작업을 대기상태로 만든 경우에만 entity 반환
+        try:
+            entity = ModelGcloneJob.get_by_path(source, target)
+            if entity is None:
+                entity = ModelGcloneJob(source, target, comment=comment, priority=priority)
+            elif entity.state == 'completed':
+                entity.state = 'wait'
+                entity.attempts = 0
+                entity.priority = priority
+                entity.comment = comment
+                entity.completed_time = None
+                entity.updated_time = datetime.now()
+            else:
+                return None
+            db.session.add(entity)
+            db.session.commit()
+            return entity
+        except Exception as e:
+            db.session.rollback()
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+            return None
+
+    @staticmethod
+    def claim_next(exclude_ids=None):
+        try:
+            query = db.session.query(ModelGcloneJob).filter(ModelGcloneJob.state == 'wait')
+            if exclude_ids:
+                query = query.filter(not_(ModelGcloneJob.id.in_(list(exclude_ids))))
+            entity = query.order_by(desc(ModelGcloneJob.priority), ModelGcloneJob.id).with_for_update().first()
+            if entity is None:
+                return None
+            entity.state = 'running'
+            entity.attempts += 1
+            entity.updated_time = datetime.now()
+            db.session.commit()
+            return entity
+        except Exception as e:
+            db.session.rollback()
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+            return None
+
+    @staticmethod
+    def set_state(id, state):
+        try:
+            now = datetime.now()
+            values = {'state':state, 'updated_time':now}
+            if state == 'completed':
+                values['completed_time'] = now
+            db.session.query(ModelGcloneJob).filter_by(id=id).update(values)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+
+    @staticmethod
+    def reset_state():
+        # 중단/실패한 작업을 다시 대기상태로
+        try:
+            count = db.session.query(ModelGcloneJob).filter(ModelGcloneJob.state.in_(['running', 'failed'])).update({'state':'wait'}, synchronize_session=False)
+            db.session.commit()
+            return count
+        except Exception as e:
+            db.session.rollback()
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+            return 0
+
+    @staticmethod
+    def get_queue_list():
+        try:
+            query = db.session.query(ModelGcloneJob).filter(ModelGcloneJob.state != 'completed')
+            return query.order_by(desc(ModelGcloneJob.priority), ModelGcloneJob.id).all()
+        except Exception as e:
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+            return []
+
+    @staticmethod
+    def get_queue_text():
+        return u'\n'.join([x.to_line() for x in ModelGcloneJob.get_queue_list()])
+
+    @staticmethod
+    def sync_from_text(text):
+        # 작업 큐 textarea 저장: 없어진 대기 작업은 삭제, 추가된 줄은 등록
+        try:
+            parsed = {}
+            order = []
+            for line in text.split('\n'):
+                tmp = ModelGcloneJob.parse_line(line)
+                if tmp is not None and (tmp[0], tmp[1]) not in parsed:
+                    parsed[(tmp[0], tmp[1])] = tmp[2]
+                    order.append((tmp[0], tmp[1]))
+
+            deleted = 0
+            for entity in ModelGcloneJob.get_queue_list():
+                key = (entity.source, entity.target)
+                if key in parsed:
+                    if entity.comment != parsed[key]:
+                        entity.comment = parsed[key]
+                    del parsed[key]
+                elif entity.state != 'running':
+                    db.session.delete(entity)
+                    deleted += 1
+            db.session.commit()
+
+            added = 0
+            for key in order:
+                if key not in parsed:
+                    continue
+                if ModelGcloneJob.enqueue(key[0], key[1], comment=parsed[key]) is not None:
+                    added += 1
+            return added, deleted
+        except Exception as e:
+            db.session.rollback()
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+            return 0, 0
+
+
+class ModelDriveCache(db.Model):
+    __tablename__ = '%s_drive_cache' % package_name
+    __table_args__ = (
+        db.Index('ix_%s_drive_cache_checked_time' % package_name, 'checked_time'),
+        {'mysql_collate': 'utf8_general_ci'}
+    )
+    __bind_key__ = package_name
+
+    id = db.Column(db.Integer, primary_key=True)
+    drive_id = db.Column(db.String, unique=True, nullable=False)
+    mimetype = db.Column(db.String)
+    size = db.Column(db.Integer)
+    modified_time = db.Column(db.String)
+    error = db.Column(db.String)    # 조회 실패시 에러, None: 정상
+    checked_time = db.Column(db.DateTime)
+
+    # sqlite 변수 개수 제한
+    chunk_size = 500
+    # 실행중 통계
+    stats = {'hit':0, 'negative_hit':0, 'miss':0}
+
+    def __repr__(self):
+        return repr(self.as_dict())
+
+    def as_dict(self):
+        ret = {x.name: getattr(self, x.name) for x in self.__table__.columns}
+        ret['checked_time'] = self.checked_time.strftime('%Y-%m-%d %H:%M:%S') if self.checked_time is not None else None
+        return ret
+
+    @staticmethod
+    def get_valid(drive_ids, ttl, negative_ttl):
+        # 유효한 캐시만 반환: drive_id -> files.get 응답 형식 dict, 실패 캐시는 None
+        ret = {}
+        try:
+            now = datetime.now()
+            columns = [ModelDriveCache.drive_id, ModelDriveCache.mimetype, ModelDriveCache.size,
+                    ModelDriveCache.modified_time, ModelDriveCache.error, ModelDriveCache.checked_time]
+            for i in range(0, len(drive_ids), ModelDriveCache.chunk_size):
+                chunk = drive_ids[i:i+ModelDriveCache.chunk_size]
+                for drive_id, mimetype, size, modified_time, error, checked_time in \
+                        db.session.query(*columns).filter(ModelDriveCache.drive_id.in_(chunk)):
+                    if checked_time is None:
+                        continue
+                    if error is None:
+                        if checked_time + timedelta(minutes=ttl) < now:
+                            continue
+                        finfo = {'id':drive_id, 'mimeType':mimetype}
+                        if size is not None: finfo['size'] = str(size)
+                        if modified_time is not None: finfo['modifiedTime'] = modified_time
+                        ret[drive_id] = finfo
+                        ModelDriveCache.stats['hit'] += 1
+                    else:
+                        if checked_time + timedelta(minutes=negative_ttl) < now:
+                            continue
+                        ret[drive_id] = None
+                        ModelDriveCache.stats['negative_hit'] += 1
+            ModelDriveCache.stats['miss'] += len(drive_ids) - len(ret)
+        except Exception as e:
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+        return ret
+
+    @staticmethod
+    def put(finfos, errors):
+        # finfos: drive_id -> files.get 응답, errors: drive_id -> 에러 메시지
+        try:
+            now = datetime.now()
+            rows = {}
+            for drive_id, finfo in finfos.items():
+                rows[drive_id] = {'drive_id':drive_id,
+                        'mimetype':finfo.get('mimeType'),
+                        'size':int(finfo['size']) if 'size' in finfo else None,
+                        'modified_time':finfo.get('modifiedTime'),
+                        'error':None,
+                        'checked_time':now}
+            for drive_id, error in errors.items():
+                rows[drive_id] = {'drive_id':drive_id, 'mimetype':None, 'size':None,
+                        'modified_time':None, 'error':u'%s' % error, 'checked_time':now}
+
+            drive_ids = list(rows.keys())
+            for i in range(0, len(drive_ids), ModelDriveCache.chunk_size):
+                chunk = drive_ids[i:i+ModelDriveCache.chunk_size]
+                exists = dict(db.session.query(ModelDriveCache.drive_id, ModelDriveCache.id).filter(ModelDriveCache.drive_id.in_(chunk)))
+                inserts = []
+                updates = []
+                for drive_id in chunk:
+                    if drive_id in exists:
+                        row = dict(rows[drive_id])
+                        row['id'] = exists[drive_id]
+                        updates.append(row)
+                    else:
+                        inserts.append(rows[drive_id])
+                db.session.bulk_insert_mappings(ModelDriveCache, inserts)
+                db.session.bulk_update_mappings(ModelDriveCache, updates)
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+
+    @staticmethod
+    def evict(ttl, negative_ttl, max_entries):
+        # 만료된 항목 삭제 후 최대 개수(0: 제한없음)를 넘으면 오래된 순으로 삭제
+        try:
+            now = datetime.now()
+            query = db.session.query(ModelDriveCache).filter(or_(
+                and_(ModelDriveCache.error == None, ModelDriveCache.checked_time < now - timedelta(minutes=ttl)),
+                and_(ModelDriveCache.error != None, ModelDriveCache.checked_time < now - timedelta(minutes=negative_ttl))))
+            count = query.delete(synchronize_session=False)
+            total = db.session.query(ModelDriveCache).count()
+            if max_entries > 0 and total > max_entries:
+                subquery = db.session.query(ModelDriveCache.id).order_by(ModelDriveCache.checked_time).limit(total - max_entries).subquery()
+                count += db.session.query(ModelDriveCache).filter(ModelDriveCache.id.in_(subquery)).delete(synchronize_session=False)
+            db.session.commit()
+            if count > 0:
+                logger.debug('drive cache evicted: %d', count)
+        except Exception as e:
+            db.session.rollback()
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+
+    @staticmethod
+    def get_stats():
+        try:
+            ret = dict(ModelDriveCache.stats)
+            ret['count'] = db.session.query(ModelDriveCache).count()
+            ret['negative_count'] = db.session.query(ModelDriveCache).filter(ModelDriveCache.error != None).count()
+            return ret
+        except Exception as e:
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+            return None
+
+    @staticmethod
+    def clear():
+        try:
+            db.session.query(ModelDriveCache).delete()
+            db.session.commit()
+            for key in ModelDriveCache.stats:
+                ModelDriveCache.stats[key] = 0
+            return True
+        except Exception as e:
+            db.session.rollback()
+            logger.error('Exception:%s', e)
+            logger.error(traceback.format_exc())
+            return False
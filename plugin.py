@@ -21,9 +21,9 @@ from system.model import ModelSetting as SystemModelSetting
 package_name = __name__.split('.')[0]
 logger = get_logger(package_name)
 
-from .model import ModelSetting
+from .model import ModelSetting, ModelDriveCache
 from .logic import Logic
-from .logic_autorclone import LogicAutoRclone
+from .logic_autorclone import LogicAutoRclone, SAPool
 from .logic_gclone import LogicGclone
 from .logic_gsheet import LogicGSheet
 #########################################################
@@ -109,7 +109,9 @@ def second_menu(sub, sub2):
                 arg['autorclone_credentials_status_str'] = 'credentials 파일이 있습니다.' if arg['autorclone_credentials_status'] else 'credentials 파일이 없습니다.'
                 arg['autorclone_token_status'] = os.path.exists(ModelSetting.get('path_token'))
                 arg['autorclone_token_status_str'] = 'API 토큰이 있습니다.' if arg['autorclone_token_status'] else 'API 토큰이 없습니다.'
-                arg['autorclone_sa_count'] = len(glob.glob(os.path.join(ModelSetting.get('path_accounts'), '*.json')))
+                SAPool.refresh()
+                arg['autorclone_sa_count'] = len(SAPool.accounts)
+                arg['autorclone_sa_ledger'] = SAPool.get_stats()
                 try:
                     project_id = json.loads(open(arg['path_credentials'],'r').read())['installed']['project_id']
                     arg['api_use1'] = 'https://console.developers.google.com/apis/library/serviceusage.googleapis.com?project=%s' % project_id
@@ -122,11 +124,16 @@ def second_menu(sub, sub2):
             if sub2 == 'setting':
                 return render_template('{package_name}_{sub}_{sub2}.html'.format(package_name=package_name, sub=sub, sub2=sub2), arg=arg)
             elif sub2 == 'command':
+                arg['gclone_queue_list'] = LogicGclone.get_queue_text()
                 return render_template('{package_name}_{sub}_{sub2}.html'.format(package_name=package_name, sub=sub, sub2=sub2), arg=arg)
         elif sub == 'gsheet':
             if sub2 == 'setting':
                 arg['scheduler'] = str(scheduler.is_include("rclone_expand_gsheet"))
                 arg['is_running'] = str(scheduler.is_running("rclone_expand_gsheet"))
+                stats = ModelDriveCache.get_stats()
+                arg['drive_cache_stats'] = u'항목: {count}(실패: {negative_count}), hit: {hit}, 실패 hit: {negative_hit}, miss: {miss}'.format(**stats) if stats is not None else u'-'
+                arg['setting_cache_stats'] = u'항목: {count}, hit(절약한 DB 조회): {hit}, miss: {miss}'.format(**ModelSetting.get_cache_stats())
+                arg['warmup_status'] = Logic.get_warmup_text()
                 return render_template('{package_name}_{sub}_{sub2}.html'.format(package_name=package_name, sub=sub, sub2=sub2), arg=arg)
             elif sub2 == 'list':
                 return render_template('{package_name}_{sub}_{sub2}.html'.format(package_name=package_name, sub=sub, sub2=sub2), arg=arg)
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# SJVA 환경(framework)에서 실행: rclone_expand 패키지가 import 가능해야 함
+import pytest
+
+pytest.importorskip('framework')
+sqlalchemy = pytest.importorskip('sqlalchemy')
+from sqlalchemy import Column, Integer, String, create_engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from rclone_expand.model import ListModelItem
+from rclone_expand.logic_gsheet import LogicGSheet
+
+Base = declarative_base()
+
+
+class Row(Base):
+    __tablename__ = 'row'
+    id = Column(Integer, primary_key=True)
+    str_size = Column(String)
+
+
+SAMPLES = [u'', u'0', u'12', u' 12 ', u'+12', u'-3', u'1,234', u'1,234,567',
+           u'1.5', u'12abc', u'abc', u'  ',
+           u'100 Bytes', u'3 kBytes', u'3 KBytes', u'1.5 GBytes', u'1,024.5 MBytes',
+           u'2 TBytes', u'123.456 GBytes', u'999.99 TBytes', u'1. GBytes', u'.5 GBytes', u'-1.5 GBytes',
+           u'1  GBytes', u' 1 GBytes', u'1 GBytes ', u'1.2.3 GBytes', u'. GBytes', u'12 XBytes',
+           u'GBytes', u'1 GB', u'5 Bytes extra']
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([Row(id=idx, str_size=value) for idx, value in enumerate(SAMPLES)])
+    session.add(Row(id=len(SAMPLES), str_size=None))
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_expression_matches_get_byte_size(session):
+    expr = ListModelItem.get_byte_size_expression(Row.str_size)
+    result = dict(session.query(Row.id, expr).all())
+    for idx, value in enumerate(SAMPLES):
+        assert result[idx] == LogicGSheet.get_byte_size(value), value
+
+
+def test_null_is_zero(session):
+    expr = ListModelItem.get_byte_size_expression(Row.str_size)
+    assert session.query(expr).filter(Row.id == len(SAMPLES)).scalar() == 0
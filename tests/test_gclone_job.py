@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# SJVA 환경(framework)에서 실행: rclone_expand 패키지가 import 가능해야 함
+import pytest
+
+pytest.importorskip('framework')
+sqlalchemy = pytest.importorskip('sqlalchemy')
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import rclone_expand.model as model
+from rclone_expand.model import ModelGcloneJob
+
+
+class FakeDb(object):
+    def __init__(self, session):
+        self.session = session
+
+
+@pytest.fixture
+def session(monkeypatch):
+    engine = create_engine('sqlite://')
+    ModelGcloneJob.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    monkeypatch.setattr(model, 'db', FakeDb(session))
+    yield session
+    session.close()
+
+
+def test_claim_order(session):
+    first = ModelGcloneJob.enqueue(u'gc:{a}', u'gc:{b}')
+    second = ModelGcloneJob.enqueue(u'gc:{c}', u'gc:{d}')
+    urgent = ModelGcloneJob.enqueue(u'gc:{e}', u'gc:{f}', priority=10)
+    assert [ModelGcloneJob.claim_next().id for _ in range(3)] == [urgent.id, first.id, second.id]
+    assert ModelGcloneJob.claim_next() is None
+
+
+def test_claim_marks_running(session):
+    job = ModelGcloneJob.enqueue(u'gc:{a}', u'gc:{b}')
+    claimed = ModelGcloneJob.claim_next()
+    assert claimed.id == job.id
+    assert claimed.state == 'running'
+    assert claimed.attempts == 1
+    # 실행중이거나 대기중인 작업은 다시 등록되지 않음
+    assert ModelGcloneJob.enqueue(u'gc:{a}', u'gc:{b}') is None
+
+
+def test_claim_exclude_ids(session):
+    first = ModelGcloneJob.enqueue(u'gc:{a}', u'gc:{b}')
+    second = ModelGcloneJob.enqueue(u'gc:{c}', u'gc:{d}')
+    assert ModelGcloneJob.claim_next(exclude_ids=set([first.id])).id == second.id
+    assert ModelGcloneJob.claim_next(exclude_ids=set([first.id])) is None
+    assert ModelGcloneJob.claim_next().id == first.id
+
+
+def test_state_transitions(session):
+    job = ModelGcloneJob.enqueue(u'gc:{a}', u'gc:{b}')
+    ModelGcloneJob.claim_next()
+    ModelGcloneJob.set_state(job.id, 'completed')
+    session.expire_all()
+    entity = ModelGcloneJob.get_by_path(u'gc:{a}', u'gc:{b}')
+    assert entity.state == 'completed' and entity.completed_time is not None
+    assert not ModelGcloneJob.is_pending(u'gc:{a}', u'gc:{b}')
+
+    # 완료된 작업은 다시 대기상태로 등록
+    again = ModelGcloneJob.enqueue(u'gc:{a}', u'gc:{b}', priority=5)
+    assert again.id == job.id and again.state == 'wait' and again.attempts == 0
+    assert ModelGcloneJob.claim_next().attempts == 1
+
+    # 중단/실패한 작업은 reset_state로 대기상태
+    ModelGcloneJob.set_state(job.id, 'failed')
+    ModelGcloneJob.reset_state()
+    session.expire_all()
+    assert ModelGcloneJob.claim_next().id == job.id
+
+
+def test_parse_line():
+    assert ModelGcloneJob.parse_line(u'gc:{a}|gc:{b} #메모') == (u'gc:{a}', u'gc:{b}', u'메모')
+    assert ModelGcloneJob.parse_line(u' gc:{a} | gc:{b} ') == (u'gc:{a}', u'gc:{b}', u'')
+    assert ModelGcloneJob.parse_line(u'gc:{a}') is None
+    assert ModelGcloneJob.parse_line(u'|gc:{b}') is None
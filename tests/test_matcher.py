@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# SJVA 환경(framework)에서 실행: rclone_expand 패키지가 import 가능해야 함
+import random
+
+import pytest
+
+pytest.importorskip('framework')
+
+from rclone_expand.logic_gsheet import KeywordMatcher, PrefixMatcher
+
+
+def test_keyword_matcher_overlap():
+    matcher = KeywordMatcher([u'hers', u'he', u'she', u''])
+    assert len(matcher) == 3
+    assert matcher.search(u'ushers') in (u'she', u'he')
+    assert matcher.search(u'his') is None
+    assert matcher.search(u'') is None
+    assert KeywordMatcher([]).search(u'anything') is None
+
+
+def test_keyword_matcher_korean():
+    matcher = KeywordMatcher([u'자막', u'1080p'])
+    assert matcher.search(u'영화 [자막포함]') == u'자막'
+    assert matcher.search(u'Movie.1080p.mkv') == u'1080p'
+    assert matcher.search(u'Movie.720p.mkv') is None
+
+
+def test_keyword_matcher_same_as_find():
+    # 이전 구현(title.find(rule) != -1)과 결과가 같아야 함
+    rnd = random.Random(0)
+    for _ in range(300):
+        keywords = [u''.join(rnd.choice(u'abc') for _ in range(rnd.randint(1, 4))) for _ in range(rnd.randint(1, 6))]
+        text = u''.join(rnd.choice(u'abcd') for _ in range(rnd.randint(0, 20)))
+        found = KeywordMatcher(keywords).search(text)
+        assert (found is not None) == any(text.find(x) != -1 for x in keywords)
+        if found is not None:
+            assert found in keywords and text.find(found) != -1
+
+
+def test_prefix_matcher_first_rule():
+    matcher = PrefixMatcher([(u'DRAMA', u'드라마'), (u'DRAMA_US', u'미드'), (u'ANI', u'애니')])
+    assert matcher.match(u'DRAMA_US') == u'드라마'
+    assert matcher.match(u'ANIMATION') == u'애니'
+    assert matcher.match(u'MOVIE') is None
+    assert PrefixMatcher([(u'', u'기타'), (u'ANI', u'애니')]).match(u'ANI') == u'기타'
+
+
+def test_prefix_matcher_same_as_startswith():
+    rnd = random.Random(1)
+    for _ in range(300):
+        rules = [(u''.join(rnd.choice(u'ab') for _ in range(rnd.randint(0, 3))), idx) for idx in range(rnd.randint(1, 6))]
+        text = u''.join(rnd.choice(u'ab') for _ in range(rnd.randint(0, 5)))
+        expected = next((value for prefix, value in rules if text.startswith(prefix)), None)
+        assert PrefixMatcher(rules).match(text) == expected
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# SJVA 환경(framework)에서 실행: rclone_expand 패키지가 import 가능해야 함
+import pytest
+
+pytest.importorskip('framework')
+sqlalchemy = pytest.importorskip('sqlalchemy')
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import rclone_expand.logic as logic
+from rclone_expand.logic import Logic
+from rclone_expand.model import ModelSetting, ListModelItem
+
+
+class FakeDb(object):
+    def __init__(self, engine):
+        self.engine = engine
+
+    def get_engine(self, app, bind=None):
+        return self.engine
+
+
+@pytest.fixture
+def engine():
+    return create_engine('sqlite://')
+
+
+@pytest.fixture
+def settings(monkeypatch, engine):
+    values = {'db_version':'1'}
+    monkeypatch.setattr(ModelSetting, 'get_int', staticmethod(lambda key: int(values[key])))
+    monkeypatch.setattr(ModelSetting, 'set', staticmethod(lambda key, value: values.__setitem__(key, value)))
+    monkeypatch.setattr(logic.LogicGSheet, 'ws_ir_init', staticmethod(lambda: None))
+    monkeypatch.setattr(logic, 'db', FakeDb(engine))
+    return values
+
+
+def test_migration_stops_when_not_applied(monkeypatch, settings):
+    applied = []
+    def step(version, ret=None):
+        def func(conn):
+            applied.append(version)
+            return ret
+        return func
+    monkeypatch.setattr(Logic, 'get_migrations', staticmethod(lambda: [(2, step(2)), (3, step(3, False)), (4, step(4))]))
+    Logic.migration()
+    assert applied == [2, 3]
+    assert settings['db_version'] == '2'
+
+    # 다음 시작시 적용되지 않은 단계부터 다시 시도
+    del applied[:]
+    Logic.migration()
+    assert applied == [3]
+    assert settings['db_version'] == '2'
+
+
+def test_migration_skips_applied_versions(monkeypatch, settings):
+    applied = []
+    settings['db_version'] = '3'
+    monkeypatch.setattr(Logic, 'get_migrations', staticmethod(lambda: [(version, lambda conn, v=version: applied.append(v)) for version in (2, 3, 4, 5)]))
+    Logic.migration()
+    assert applied == [4, 5]
+    assert settings['db_version'] == '5'
+
+
+def test_add_column_is_idempotent(engine):
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE item (id INTEGER PRIMARY KEY)'))
+        Logic.add_column(conn, 'item', 'byte_size', 'INTEGER default 0')
+        Logic.add_column(conn, 'item', 'byte_size', 'INTEGER default 0')
+        assert Logic.get_columns(conn, 'item') == {'id':'INTEGER', 'byte_size':'INTEGER'}
+
+
+def test_migration_v5(monkeypatch, engine):
+    monkeypatch.setattr(ListModelItem, 'fts_enabled', None)
+    ListModelItem.__table__.create(engine)
+    with engine.begin() as conn:
+        applied = Logic.migration_v5(conn)
+    with engine.connect() as conn:
+        exists = conn.execute(text("SELECT count(*) FROM sqlite_master WHERE type='table' AND name=:name"), {'name':ListModelItem.fts_table_name}).scalar() > 0
+    if applied is False:
+        # FTS5 trigram을 지원하지 않는 sqlite: 버전을 올리지 않고 LIKE 검색
+        assert not exists
+        return
+    assert exists
+    with engine.begin() as conn:
+        conn.execute(ListModelItem.__table__.insert(), [{'id':1, 'title':u'Some Movie 2020', 'title2':u'', 'category':u'MOVIE', 'folder_id':u'abc'}])
+        ids = [row[0] for row in conn.execute(text('SELECT rowid FROM {fts} WHERE {fts} MATCH :match'.format(fts=ListModelItem.fts_table_name)), {'match':u'"Movie"'})]
+        assert ids == [1]
+        conn.execute(ListModelItem.__table__.update().values(title=u'Other'))
+        ids = [row[0] for row in conn.execute(text('SELECT rowid FROM {fts} WHERE {fts} MATCH :match'.format(fts=ListModelItem.fts_table_name)), {'match':u'"Movie"'})]
+        assert ids == []
+
+
+def test_filter_search_fallback(monkeypatch):
+    query = sessionmaker()().query(ListModelItem)
+    monkeypatch.setattr(ListModelItem, 'fts_enabled', False)
+    sql = str(ListModelItem.filter_search(query, ['title', 'title2'], [u'movie']))
+    assert 'LIKE' in sql and 'MATCH' not in sql
+
+    monkeypatch.setattr(ListModelItem, 'fts_enabled', True)
+    sql = str(ListModelItem.filter_search(query, ['title', 'title2'], [u'movie']))
+    assert 'MATCH' in sql and 'LIKE' not in sql
+    # trigram은 3글자 미만 검색 불가
+    sql = str(ListModelItem.filter_search(query, ['title', 'title2'], [u'movie', u'ab']))
+    assert 'LIKE' in sql and 'MATCH' not in sql
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# SJVA 환경(framework)에서 실행: rclone_expand 패키지가 import 가능해야 함
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('framework')
+sqlalchemy = pytest.importorskip('sqlalchemy')
+from sqlalchemy import Column, Integer, DateTime, create_engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from rclone_expand.model import QueryPager
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = 'item'
+    id = Column(Integer, primary_key=True)
+    updated_time = Column(DateTime)
+    byte_size = Column(Integer)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    now = datetime(2020, 1, 1)
+    for i in range(1, 48):
+        # 일부 행은 NULL(migration 이전 행), 같은 값도 섞음
+        updated_time = None if i % 3 == 0 else now + timedelta(minutes=i % 7)
+        byte_size = None if i % 4 == 0 else (i % 5) * 1024
+        session.add(Item(id=i, updated_time=updated_time, byte_size=byte_size))
+    session.commit()
+    yield session
+    session.close()
+
+
+def make_query(session, keys):
+    query = session.query(Item)
+    for column, is_desc in keys:
+        query = query.order_by(column.desc() if is_desc else column)
+    return query
+
+
+def page_all(session, keys, page_size=5):
+    # 다음 페이지는 항상 이전 응답의 cursor로 조회(keyset)
+    pages = []
+    cursor = None
+    page = 1
+    while True:
+        lists, cursor = QueryPager.get_page(make_query(session, keys), keys, page, page_size, json.dumps(cursor) if cursor else None, 'sig')
+        if len(lists) == 0:
+            break
+        pages.append([x.id for x in lists])
+        page += 1
+    return pages
+
+
+@pytest.mark.parametrize('keys', [
+    [(Item.updated_time, True), (Item.id, True)],
+    [(Item.updated_time, False), (Item.id, False)],
+    [(Item.byte_size, True), (Item.id, True)],
+    [(Item.byte_size, False), (Item.id, False)],
+])
+def test_keyset_paging_includes_null_keys(session, keys):
+    expected = [x.id for x in make_query(session, keys).all()]
+    pages = page_all(session, keys)
+    assert sum(pages, []) == expected
+    # OFFSET으로 조회한 페이지와 같아야 함
+    for idx, ids in enumerate(pages):
+        lists, _ = QueryPager.get_page(make_query(session, keys), keys, idx+1, 5, None, 'sig')
+        assert [x.id for x in lists] == ids
+
+
+@pytest.mark.parametrize('keys', [
+    [(Item.updated_time, True), (Item.id, True)],
+    [(Item.updated_time, False), (Item.id, False)],
+])
+def test_keyset_paging_backward(session, keys):
+    pages = page_all(session, keys)
+    for idx in range(len(pages)-1, 0, -1):
+        lists, cursor = QueryPager.get_page(make_query(session, keys), keys, idx+1, 5, None, 'sig')
+        lists, _ = QueryPager.get_page(make_query(session, keys), keys, idx, 5, json.dumps(cursor), 'sig')
+        assert [x.id for x in lists] == pages[idx-1]
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# SJVA 환경(framework)에서 실행: rclone_expand 패키지가 import 가능해야 함
+import pytest
+
+pytest.importorskip('framework')
+
+from rclone_expand.logic_autorclone import SAPool
+from rclone_expand.model import ModelSetting
+
+HOUR = 3600
+GB = 1024**3
+
+
+@pytest.fixture
+def ledger(monkeypatch):
+    settings = {'autorclone_sa_daily_limit':1, 'autorclone_sa_cooldown':1}
+    monkeypatch.setattr(ModelSetting, 'get_int', staticmethod(lambda key: settings.get(key)))
+    monkeypatch.setattr(SAPool, 'ledger', {})
+    monkeypatch.setattr(SAPool, 'ledger_dirty', False)
+    monkeypatch.setattr(SAPool, 'save_ledger', staticmethod(lambda force=False: None))
+    return SAPool.ledger
+
+
+def test_get_usage_window(ledger):
+    now = 100 * HOUR + 10
+    ledger['a.json'] = {'buckets':{'76':[5, 1], '77':[7, 0], '100':[3, 2]}, 'last_error':0, 'last_used':0}
+    # 24시간 이전 bucket(76)은 제외
+    assert SAPool.get_usage('a.json', now) == (10, 2)
+    assert SAPool.get_usage('none.json', now) == (0, 0)
+
+    SAPool.prune(now)
+    assert sorted(ledger['a.json']['buckets'].keys()) == ['100', '77']
+
+
+def test_is_healthy(ledger):
+    now = 100 * HOUR + 10
+    assert SAPool.is_healthy('a.json', now)
+    ledger['a.json'] = {'buckets':{'100':[GB, 0]}, 'last_error':0, 'last_used':0}
+    assert not SAPool.is_healthy('a.json', now)
+    # 사용량이 24시간 밖으로 밀려나면 다시 사용 가능
+    assert SAPool.is_healthy('a.json', now + 24 * HOUR)
+
+    ledger['b.json'] = {'buckets':{}, 'last_error':now - 30, 'last_used':0}
+    assert not SAPool.is_healthy('b.json', now)
+    assert SAPool.is_healthy('b.json', now + 31)
+
+
+def test_record(ledger):
+    SAPool.record('/sa/a.json', size=10)
+    SAPool.add_bytes('/sa/a.json', 20)
+    SAPool.add_bytes('/sa/a.json', 0)
+    SAPool.record(None, size=100)
+    import time
+    assert SAPool.get_usage('a.json', time.time()) == (30, 0)
+    assert SAPool.ledger_dirty
+
+
+def test_check_error(ledger):
+    assert SAPool.check_error('/sa/a.json', u'Failed to copy: googleapi: Error 429: Too many requests') == 429
+    assert SAPool.check_error('/sa/a.json', u'googleapi: Error 403: User rate limit exceeded., userRateLimitExceeded') == 403
+    assert SAPool.check_error('/sa/a.json', u'googleapi: Error 403: The user does not have sufficient permissions') is None
+    assert SAPool.check_error('/sa/a.json', u'googleapi: Error 404: File not found') is None
+    assert SAPool.check_error('/sa/a.json', u'Error 4290') is None
+    assert SAPool.check_error('/sa/a.json', u'quotaExceeded', code=403) == 403
+    import time
+    assert SAPool.get_usage('a.json', time.time()) == (0, 3)
+    assert ledger['a.json']['last_error'] > 0
+
+
+def test_parse_size():
+    assert SAPool.parse_size(u'') == 0
+    assert SAPool.parse_size(None) == 0
+    assert SAPool.parse_size(u'-') == 0
+    assert SAPool.parse_size(u'100') == 100
+    assert SAPool.parse_size(u'2k') == 2048
+    assert SAPool.parse_size(u'1.5 GBytes') == int(1.5 * GB)
+    assert SAPool.parse_size(u'12.5 GiB') == int(12.5 * GB)
+    assert SAPool.parse_size(u'3 TBytes') == 3 * 1024**4